@@ -1,8 +1,12 @@
 # __init__.py  –  WtlNodes package entry point
 import importlib
+import asyncio
+import logging
 import server
 from aiohttp import web
 
+log = logging.getLogger("WtlNodes")
+
 # Define submodules to import
 SUBMODULES = [
     "image.saturation",
@@ -50,15 +54,19 @@ SUBMODULES = [
         
 ]
 
-# Initialize global mappings
-NODE_CLASS_MAPPINGS = {}
-NODE_DISPLAY_NAME_MAPPINGS = {}
+# Dynamically import the submodules and merge their mappings
+_MODULES = [importlib.import_module(f".{submodule}", package=__package__) for submodule in SUBMODULES]
 
-# Dynamically import and update the mappings
-for submodule in SUBMODULES:
-    module = importlib.import_module(f".{submodule}", package=__package__)
-    NODE_CLASS_MAPPINGS.update(getattr(module, "NODE_CLASS_MAPPINGS", {}))
-    NODE_DISPLAY_NAME_MAPPINGS.update(getattr(module, "NODE_DISPLAY_NAME_MAPPINGS", {}))
+NODE_CLASS_MAPPINGS = {
+    name: cls
+    for module in _MODULES
+    for name, cls in getattr(module, "NODE_CLASS_MAPPINGS", {}).items()
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    name: display
+    for module in _MODULES
+    for name, display in getattr(module, "NODE_DISPLAY_NAME_MAPPINGS", {}).items()
+}
 
 # Create registry for node handlers
 NODE_HANDLERS = {
@@ -164,6 +172,51 @@ NODE_HANDLERS = {
     },
 }
 
+# Resolve each handler's module once so the routes skip the import machinery
+for handler in NODE_HANDLERS.values():
+    module = importlib.import_module(handler["module"], package=__package__)
+    handler["set_params"] = module._set_params
+    handler["set_flag"] = module._set_flag
+    handler["get_processing_time"] = getattr(module, "_get_processing_time", None)
+
+# Slider updates are coalesced: the route only records the latest values per
+# node and a background task hands them to the node module at most once per tick
+PARAMS_FLUSH_INTERVAL = 0.016
+_PENDING_PARAMS: dict[tuple[str, str], list] = {}
+_PARAMS_EVENT = None
+_FLUSH_TASK = None
+
+def _flush_pending_params(key=None):
+    """Apply pending slider params – all of them, or only those for ``key``."""
+    if key is not None:
+        pending = {key: _PENDING_PARAMS.pop(key)} if key in _PENDING_PARAMS else {}
+    else:
+        pending = _PENDING_PARAMS.copy()
+        _PENDING_PARAMS.clear()
+    for (node_type, node_id), params in pending.items():
+        # One bad update must not drop the others or stop the flush loop
+        try:
+            NODE_HANDLERS[node_type]["set_params"](node_id, *params)
+        except Exception:
+            log.exception("[%s] Failed to update params for node %s", node_type.upper(), node_id)
+            continue
+        log.debug("[%s] Params updated for node %s", node_type.upper(), node_id)
+
+async def _flush_params_loop():
+    while True:
+        await _PARAMS_EVENT.wait()
+        _PARAMS_EVENT.clear()
+        _flush_pending_params()
+        await asyncio.sleep(PARAMS_FLUSH_INTERVAL)
+
+def _schedule_params(node_type, node_id, params):
+    global _PARAMS_EVENT, _FLUSH_TASK
+    _PENDING_PARAMS[(node_type, node_id)] = params
+    if _FLUSH_TASK is None or _FLUSH_TASK.done():
+        _PARAMS_EVENT = asyncio.Event()
+        _FLUSH_TASK = asyncio.get_running_loop().create_task(_flush_params_loop())
+    _PARAMS_EVENT.set()
+
 # Slider‑parameter route
 @server.PromptServer.instance.routes.post("/tgsz_params")
 async def tgsz_params(request):
@@ -180,15 +233,10 @@ async def tgsz_params(request):
     
     handler = NODE_HANDLERS[node_type]
     
-    # Dynamically import the module
-    from importlib import import_module
-    module = import_module(handler["module"], package=__package__)
-    
     # Extract only params this node type needs
     params = [data.get(k) for k in handler["params"]]
-    module._set_params(node_id, *params)
+    _schedule_params(node_type, node_id, params)
     
-    print(f"[{node_type.upper()}] Params updated for node {node_id}")
     return web.json_response({"status": "ok"})
 
 # Button‑press route (Apply / Skip / Apply Again)
@@ -212,14 +260,13 @@ async def tgsz_control(request):
     
     handler = NODE_HANDLERS[node_type]
     
-    # Dynamically import module
-    from importlib import import_module
-    module = import_module(handler["module"], package=__package__)
-    
+    # Make sure the button acts on the latest slider values
+    _flush_pending_params((node_type, node_id))
+
     # Call _set_flag on appropriate module
-    module._set_flag(node_id, action)
+    handler["set_flag"](node_id, action)
     
-    print(f"[{node_type.upper()}] Flag '{action}' set for node {node_id}")
+    log.debug("[%s] Flag '%s' set for node %s", node_type.upper(), action, node_id)
     return web.json_response({"status": "ok"})
 
 # Get processing time route
@@ -237,13 +284,9 @@ async def tgsz_time(request):
     
     handler = NODE_HANDLERS[node_type]
     
-    # Dynamically import module
-    from importlib import import_module
-    module = import_module(handler["module"], package=__package__)
-    
     # Get processing time if function exists
-    if hasattr(module, '_get_processing_time'):
-        processing_ms, complete = module._get_processing_time(node_id)
+    if handler["get_processing_time"] is not None:
+        processing_ms, complete = handler["get_processing_time"](node_id)
         return web.json_response({
             "status": "ok", 
             "processing_time_ms": processing_ms,
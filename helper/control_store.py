@@ -0,0 +1,80 @@
+import threading
+
+
+class ControlStore:
+    """Per-node slider params, button flags and processing time.
+
+    Written by the ``/tgsz_*`` routes and read by a node's preview loop. Every
+    update is a single dict store or pop, which is atomic under the GIL, so the
+    two sides never contend on a lock. A per-node event wakes the preview loop
+    as soon as the UI writes anything for it.
+    """
+
+    def __init__(self):
+        self._params: dict[str, tuple] = {}
+        self._params_changed: dict[str, bool] = {}
+        self._flags: dict[tuple[str, str], bool] = {}
+        self._processing: dict[str, tuple[int, bool]] = {}
+        self._wake_events: dict[str, threading.Event] = {}
+        self._inputs: dict[str, tuple] = {}
+
+    def _wake_event(self, node_id: str) -> threading.Event:
+        return self._wake_events.setdefault(node_id, threading.Event())
+
+    def wait_for_update(self, node_id: str, timeout: float = 1.0) -> None:
+        """Block until the UI sends new params or a button press for this node."""
+        event = self._wake_event(node_id)
+        event.wait(timeout)
+        event.clear()
+
+    def set_params(self, node_id: str, params: tuple) -> None:
+        if self._params.get(node_id) != params:
+            self._params[node_id] = params
+            self._processing[node_id] = (self._processing.get(node_id, (0, False))[0], False)
+            self._params_changed[node_id] = True
+        self._wake_event(node_id).set()
+
+    def get_params(self, node_id: str, defaults: tuple) -> tuple:
+        return self._params.get(node_id, defaults)
+
+    def check_and_clear_params_changed(self, node_id: str) -> bool:
+        return self._params_changed.pop(node_id, False)
+
+    def set_processing_time(self, node_id: str, ms: int) -> None:
+        self._processing[node_id] = (ms, True)
+
+    def touch_processing_time(self, node_id: str) -> None:
+        """Mark the current preview complete again, keeping its last timing."""
+        self._processing[node_id] = (self._processing.get(node_id, (0, False))[0], True)
+
+    def get_processing_time(self, node_id: str) -> tuple:
+        return self._processing.get(node_id, (0, False))
+
+    def set_flag(self, node_id: str, flag: str) -> None:
+        self._flags[(node_id, flag)] = True
+        self._wake_event(node_id).set()
+
+    def check_and_clear_flag(self, node_id: str, flag: str) -> bool:
+        return self._flags.pop((node_id, flag), False)
+
+    def clear_flags(self, node_id: str, inputs: tuple) -> None:
+        """Drop stale button presses and change markers for a new run.
+
+        The last slider params are kept only while the node's own widget inputs
+        match those of the run they were stored in; an input driven by a link or
+        primitive that changed between runs takes precedence.
+        """
+        if self._inputs.get(node_id) != inputs:
+            self._params.pop(node_id, None)
+            self._inputs[node_id] = inputs
+        self._params_changed.pop(node_id, None)
+        for key in [k for k in list(self._flags) if k[0] == node_id]:
+            self._flags.pop(key, None)
+
+    def clear_all(self, node_id: str) -> None:
+        self._params.pop(node_id, None)
+        self._inputs.pop(node_id, None)
+        self._params_changed.pop(node_id, None)
+        self._processing.pop(node_id, None)
+        for key in [k for k in list(self._flags) if k[0] == node_id]:
+            self._flags.pop(key, None)
@@ -1,42 +1,227 @@
-import numpy as np
 import base64
-import io
-from PIL import Image
+import logging
+import cv2
+import torch
+import torch.nn.functional as F
 import server
 import math
+import os
+from functools import lru_cache, wraps
+import struct
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from torchvision.io import encode_jpeg
+except ImportError:
+    encode_jpeg = None
+
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+log = logging.getLogger("WtlNodes")
+
+JPEG_QUALITY = 85
+
+# Cleared after the first failed on-device encode (e.g. torchvision built
+# without nvJPEG) so later frames go straight to cv2.
+_gpu_jpeg_available = encode_jpeg is not None
+
+# cv2.imencode releases the GIL, so batch frames encode in parallel
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="wtl_preview")
+
+# Image-type codes of ComfyUI's binary PREVIEW_IMAGE frame.
+_BINARY_JPEG = 1
+_BINARY_PNG = 2
+
+# Reusable host buffers for device frames: one pool per frame shape, grown to
+# the largest batch seen so every batch slot keeps its own buffer
+_HOST_SCRATCH: dict[tuple, list[torch.Tensor]] = {}
+# Encode-pool workers look up and grow the pools concurrently
+_SCRATCH_LOCK = threading.Lock()
+
+def _to_host(frame, index):
+    """Copy a uint8 frame into a reusable host buffer instead of a fresh allocation."""
+    if frame.device.type == "cpu":
+        # Encoders need C-contiguous rows; permuted inputs keep their strides
+        return frame.contiguous()
+    shape = tuple(frame.shape)
+    with _SCRATCH_LOCK:
+        pool = _HOST_SCRATCH.get(shape)
+        if pool is None:
+            # Only a few frame shapes are live at a time (preview size, full size)
+            if len(_HOST_SCRATCH) >= 4:
+                _HOST_SCRATCH.clear()
+            pool = _HOST_SCRATCH[shape] = []
+        while len(pool) <= index:
+            pool.append(torch.empty(shape, dtype=torch.uint8))
+        buf = pool[index]
+    # Each batch slot owns its buffer, so the copy itself runs unlocked
+    return buf.copy_(frame)
+
+@lru_cache(maxsize=16)
+def _preview_size(height, width):
+    """Target (H, W) for a preview capped at ~1 MP, or None if already small enough."""
+    current_pixels = width * height
+    if current_pixels <= 1_000_000:
+        return None
+    scale = math.sqrt(1_000_000 / current_pixels)
+    return (int(height * scale), int(width * scale))
+
+def _encode_frame(frame, lossless, index=0):
+    """Encode an (H, W, C) uint8 RGB(A) tensor to PNG or JPEG bytes."""
+    global _gpu_jpeg_available
+    if not lossless and frame.shape[-1] == 3 and frame.is_cuda and _gpu_jpeg_available:
+        # nvJPEG: only the compressed bytes leave the device
+        try:
+            return encode_jpeg(frame.permute(2, 0, 1).contiguous(), quality=JPEG_QUALITY).cpu().numpy().tobytes()
+        except Exception:
+            _gpu_jpeg_available = False
+
+    arr = _to_host(frame, index).numpy()
+    if lossless or arr.shape[-1] == 4:
+        # Final previews (and anything with alpha) stay lossless.
+        code = cv2.COLOR_RGBA2BGRA if arr.shape[-1] == 4 else cv2.COLOR_RGB2BGR
+        ok, buf = cv2.imencode(".png", cv2.cvtColor(arr, code), [int(cv2.IMWRITE_PNG_COMPRESSION), 0])
+    elif simplejpeg is not None:
+        # libjpeg-turbo SIMD encoder, takes RGB directly
+        return simplejpeg.encode_jpeg(arr, quality=JPEG_QUALITY, colorspace="RGB")
+    else:
+        ok, buf = cv2.imencode(".jpg", cv2.cvtColor(arr, cv2.COLOR_RGB2BGR), [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    if not ok:
+        raise RuntimeError("image encoding failed")
+    return buf.tobytes()
+
+def _prepare_frames(image_tensor, resize):
+    """Downscale (for interactive previews) and quantise frames to uint8 on their device.
+
+    The returned frames are fresh tensors, so callers may reuse ``image_tensor``
+    as soon as this returns.
+    """
+    frames = []
+    # Accepts either a (B, H, W, C) tensor or a plain list of (H, W, C) tensors.
+    for frame in image_tensor:
+        if resize:
+            # Downscale on the frame's device so only the preview-sized
+            # image is copied to the CPU.
+            target = _preview_size(*frame.shape[:2])
+            if target is not None:
+                frame = F.interpolate(
+                    frame.permute(2, 0, 1).unsqueeze(0), size=target, mode="area"
+                )[0].permute(1, 2, 0)
+
+        # Quantise on the tensor so only uint8 data reaches the host
+        frames.append(frame.mul(255).clamp_(0, 255).to(torch.uint8))
+    return frames
+
+def _encode_and_send(instance, frames, unique_id, resize):
+    if len(frames) > 1:
+        encoded = list(_ENCODE_POOL.map(lambda i: _encode_frame(frames[i], not resize, i), range(len(frames))))
+    else:
+        encoded = [_encode_frame(f, lossless=not resize) for f in frames]
+
+    if resize and len(encoded) == 1:
+        # Single interactive frame: send it as a binary preview frame for the
+        # running node, skipping base64 and JSON encoding.
+        image_type = _BINARY_JPEG if encoded[0][:2] == b"\xff\xd8" else _BINARY_PNG
+        instance.send_sync(
+            server.BinaryEventTypes.PREVIEW_IMAGE,
+            struct.pack(">I", image_type) + encoded[0],
+        )
+        return
+
+    instance.send_sync(
+        "executed",
+        {
+            "node": unique_id,
+            "output": {
+                "ram_preview": [base64.b64encode(data).decode('utf-8') for data in encoded]
+            },
+            "prompt_id": None
+        }
+    )
+
+# Interactive previews are encoded and sent on a background thread through a
+# single-slot queue: the newest frame replaces one that has not been sent yet.
+_PREVIEW_QUEUE: queue.Queue = queue.Queue(maxsize=1)
+_SEND_LOCK = threading.Lock()  # the host scratch buffers are shared by all senders
+_sender_thread = None
+
+def _preview_sender():
+    while True:
+        instance, frames, unique_id = _PREVIEW_QUEUE.get()
+        try:
+            with _SEND_LOCK:
+                _encode_and_send(instance, frames, unique_id, True)
+        except Exception:
+            log.exception("[RAM Preview] Failed to send preview for node %s", unique_id)
+        finally:
+            _PREVIEW_QUEUE.task_done()
+
+def _post_latest(item):
+    global _sender_thread
+    if _sender_thread is None:
+        _sender_thread = threading.Thread(target=_preview_sender, name="wtl_preview_sender", daemon=True)
+        _sender_thread.start()
+    while True:
+        try:
+            _PREVIEW_QUEUE.put_nowait(item)
+            return
+        except queue.Full:
+            _drop_pending()
+
+def _drop_pending():
+    try:
+        _PREVIEW_QUEUE.get_nowait()
+    except queue.Empty:
+        return
+    _PREVIEW_QUEUE.task_done()
+
+def _flush_previews():
+    """Drop any queued interactive frame and wait for the one being sent.
+
+    Binary preview frames carry no node id – the frontend shows them on
+    whichever node is running when they arrive – so a node must not return
+    while one of its frames is still on the way.
+    """
+    _drop_pending()
+    _PREVIEW_QUEUE.join()
+
+def _flushes_previews(func):
+    """Decorator for interactive node functions: flush previews before returning."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _flush_previews()
+    return wrapper
 
 def _send_ram_preview(image_tensor, unique_id, resize=True):
-    """Send RAM preview via websocket (no disk I/O)."""
+    """Send RAM preview via websocket (no disk I/O).
+
+    Interactive previews (``resize=True``) are sent as JPEG from a background
+    thread, newest frame wins; final previews (``resize=False``) are sent as
+    lossless PNG before this returns. A single interactive frame goes out as a
+    binary websocket frame, everything else as an ``executed`` message.
+    """
+    # Nobody is connected to receive the preview – skip the encode entirely
+    instance = getattr(server.PromptServer, "instance", None)
+    if instance is None or not instance.sockets:
+        return
+
     try:
-        images_base64 = []
-
-        # Accepts either a (B, H, W, C) tensor or a plain list of (H, W, C) tensors.
-        for frame in image_tensor:
-            i = 255. * frame.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-
-            if resize:
-                width, height = img.size
-                current_pixels = width * height
-                if current_pixels > 1_000_000:
-                    scale = math.sqrt(1_000_000 / current_pixels)
-                    img = img.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
-
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG", compress_level=0)
-            buffer.seek(0)
-            images_base64.append(base64.b64encode(buffer.getvalue()).decode('utf-8'))
-
-        if hasattr(server.PromptServer, "instance"):
-            server.PromptServer.instance.send_sync(
-                "executed",
-                {
-                    "node": unique_id,
-                    "output": {
-                        "ram_preview": images_base64
-                    },
-                    "prompt_id": None
-                }
-            )
-    except Exception as e:
-        print(f"[RAM Preview] Error: {e}")
\ No newline at end of file
+        frames = _prepare_frames(image_tensor, resize)
+        if resize:
+            _post_latest((instance, frames, unique_id))
+            return
+
+        # A final preview supersedes any interactive frame still waiting
+        _drop_pending()
+        with _SEND_LOCK:
+            _encode_and_send(instance, frames, unique_id, False)
+    except Exception:
+        log.exception("[RAM Preview] Failed to send preview for node %s", unique_id)
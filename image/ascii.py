@@ -5,7 +5,7 @@ import numpy as np
 import os
 import sys
 from PIL import Image, ImageDraw, ImageFont
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -501,6 +501,7 @@ class ASCIIC:
     FUNCTION = "ascii_effect"
     CATEGORY = "WtlNodes/image"
     
+    @_flushes_previews
     def ascii_effect(self, image, red_weight, green_weight, blue_weight, char_set,
                      char_size, background, font_name, bold, italic, spacing, apply_type, unique_id=None):
 
@@ -1,7 +1,7 @@
 import torch
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -64,8 +64,10 @@ def _clear_all(node_id: str) -> None:
         _CONTROL_STORE.pop(node_id, None)
 
 def _apply_brightness(image, brightness):
-    result = image * (1 + brightness / 100)
-    return torch.clamp(result, 0.0, 1.0)
+    if brightness == 0.0:
+        return image
+    # Clamp in place on the freshly allocated product – one output buffer
+    return image.mul(1.0 + brightness * 0.01).clamp_(0.0, 1.0)
 
 class BrightnessC:
     @classmethod
@@ -91,6 +93,7 @@ class BrightnessC:
     FUNCTION = "brightness"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def brightness(self, image, brightness, apply_type, unique_id=None):
 
         # Clean any stale data for this node
@@ -141,7 +144,6 @@ class BrightnessC:
 
                 # Apply final effect after exiting loop
                 result = _apply_brightness(image, final_brightness)
-                result = torch.clamp(result, 0.0, 1.0)
 
             else:
                 # Process images one by one
@@ -197,7 +199,6 @@ class BrightnessC:
         else:
             # Auto-apply mode
             result = _apply_brightness(image, brightness)
-            result = torch.clamp(result, 0.0, 1.0)
 
         return {"result": (result,)}
 
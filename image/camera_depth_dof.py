@@ -1,91 +1,56 @@
 import torch
 import torch.nn.functional as F
-import cv2
 import numpy as np
 import time
-import threading
-from ..helper.ram_preview import _send_ram_preview
+from functools import lru_cache
+from ..helper.control_store import ControlStore
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews, _preview_size
 
-_CONTROL_STORE: dict[str, dict] = {}
-_CONTROL_LOCK = threading.Lock()
+_STORE = ControlStore()
 _LAST_COMPUTE: dict[str, tuple] = {}  # uid -> (compute_params, result, blur_mask, in_focus, out_focus, border)
 
+def _wait_for_update(node_id: str) -> None:
+    _STORE.wait_for_update(node_id)
+
 def _set_params(node_id: str, focal_point: float, focus_falloff: float,
                 focal_plane: float, blur_strength: float, in_focus_mask_fix: int,
                 bokeh_shape: str, highlight_factor: float, highlight_threshold_low: float,
                 highlight_threshold_high: float, preview_mode: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        new_params = (focal_point, focus_falloff, focal_plane, blur_strength,
-                      in_focus_mask_fix, bokeh_shape, highlight_factor,
-                      highlight_threshold_low, highlight_threshold_high, preview_mode)
-        if entry.get("params") != new_params:
-            entry["params"] = new_params
-            entry["params_changed"] = True
-            entry["processing_complete"] = False
+    _STORE.set_params(node_id, (focal_point, focus_falloff, focal_plane, blur_strength,
+                                in_focus_mask_fix, bokeh_shape, highlight_factor,
+                                highlight_threshold_low, highlight_threshold_high, preview_mode))
 
 def _get_params(node_id: str, focal_point: float, focus_falloff: float,
                 focal_plane: float, blur_strength: float, in_focus_mask_fix: int,
                 bokeh_shape: str, highlight_factor: float, highlight_threshold_low: float,
                 highlight_threshold_high: float, preview_mode: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return entry.get("params", (focal_point, focus_falloff, focal_plane, blur_strength,
-                                    in_focus_mask_fix, bokeh_shape, highlight_factor,
-                                    highlight_threshold_low, highlight_threshold_high,
-                                    preview_mode))
+    return _STORE.get_params(node_id, (focal_point, focus_falloff, focal_plane, blur_strength,
+                                       in_focus_mask_fix, bokeh_shape, highlight_factor,
+                                       highlight_threshold_low, highlight_threshold_high,
+                                       preview_mode))
 
 def _check_and_clear_params_changed(node_id: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        if entry.get("params_changed"):
-            entry["params_changed"] = False
-            return True
-        return False
+    return _STORE.check_and_clear_params_changed(node_id)
 
 def _set_processing_time(node_id: str, ms: int) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry["processing_time_ms"] = ms
-        entry["processing_complete"] = True
+    _STORE.set_processing_time(node_id, ms)
 
 def _get_processing_time(node_id: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return (entry.get("processing_time_ms", 0), entry.get("processing_complete", False))
+    return _STORE.get_processing_time(node_id)
 
 def _set_flag(node_id: str, flag: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry.setdefault("flags", {})[flag] = True
+    _STORE.set_flag(node_id, flag)
 
 def _check_and_clear_flag(node_id: str, flag: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        flags = entry.get("flags", {})
-        if flags.get(flag):
-            flags[flag] = False
-            return True
-        return False
+    return _STORE.check_and_clear_flag(node_id, flag)
 
-def _clear_all(node_id: str) -> None:
-    with _CONTROL_LOCK:
-        _CONTROL_STORE.pop(node_id, None)
+def _clear_flags(node_id: str, inputs: tuple) -> None:
+    _STORE.clear_flags(node_id, inputs)
     _LAST_COMPUTE.pop(node_id, None)
 
-
-def _make_preview_tensor(result_np, blur_mask_np, in_focus_mask_np, preview_mode):
-    if preview_mode == "image":
-        preview = result_np
-    elif preview_mode == "in_focus_mask":
-        preview = np.stack([in_focus_mask_np] * 3, axis=-1)
-    else:  # "blur_mask"
-        preview = np.stack([blur_mask_np] * 3, axis=-1)
-    return torch.from_numpy(preview).unsqueeze(0).float()
+def _clear_all(node_id: str) -> None:
+    _STORE.clear_all(node_id)
+    _LAST_COMPUTE.pop(node_id, None)
 
 
 def create_bokeh_kernel(size, shape='circle'):
@@ -117,6 +82,116 @@ def create_bokeh_kernel(size, shape='circle'):
     return kernel
 
 
+@lru_cache(maxsize=64)
+def _bokeh_weights(size, shape, device):
+    """Device-resident (1, 1, k, k) bokeh kernel."""
+    kernel_np = create_bokeh_kernel(size, shape)
+    if kernel_np is None:
+        return None
+    return torch.from_numpy(kernel_np).to(device).float()[None, None]
+
+
+@lru_cache(maxsize=8)
+def _luma_kernel(device):
+    """Rec. 601 luma weights as a (1, 3, 1, 1) conv kernel."""
+    return torch.tensor([0.299, 0.587, 0.114], device=device).view(1, 3, 1, 1)
+
+
+@lru_cache(maxsize=16)
+def _stacked_bokeh_weights(sizes, shape, device):
+    """(L, 1, k, k) weights holding one bokeh kernel per size in ``sizes``.
+
+    Each kernel is zero-padded and centred in the largest, so a single conv
+    produces every level at once.
+    """
+    k_max = max(sizes)
+    weight = torch.zeros((len(sizes), 1, k_max, k_max), device=device)
+    for i, size in enumerate(sizes):
+        off = (k_max - size) // 2
+        weight[i, 0, off:off + size, off:off + size] = _bokeh_weights(size, shape, device)[0, 0]
+    return weight
+
+
+# Resolution of the highlight weight table
+HIGHLIGHT_LUT_SIZE = 1024
+
+
+@lru_cache(maxsize=16)
+def _highlight_lut(highlight_factor, device):
+    """Highlight weights 2^(10 * factor * v) sampled over v in [0, 1]."""
+    v = torch.linspace(0, 1, HIGHLIGHT_LUT_SIZE, device=device)
+    return torch.exp(v * 10.0 * highlight_factor * np.log(2))
+
+
+# Pixels processed per batched DoF pass; larger batches are split into chunks
+BATCH_PIXEL_BUDGET = 4096 * 4096
+
+# Above this size a bokeh level is convolved in the frequency domain
+FFT_KERNEL_THRESHOLD = 25
+
+
+@lru_cache(maxsize=8)
+def _bokeh_kernel_fft(size, shape, fft_size, device):
+    """rfft2 of the flipped bokeh kernel, kept across preview ticks at the same blur strength."""
+    kernel_2d = _bokeh_weights(size, shape, device)[0, 0]
+    return torch.fft.rfft2(torch.flip(kernel_2d, (-2, -1)), s=fft_size)
+
+
+def fft_conv2d(x_fft, kernel_fft, k, fft_size, out_size):
+    """Zero-padded 'same' correlation with a ``k``-sized kernel, both already in rfft2 form.
+
+    ``fft_size`` must be at least ``out_size + k - 1`` on each axis so the
+    circular product contains the full linear correlation without wrap-around.
+    """
+    pad = k // 2
+    h, w = out_size
+    out = torch.fft.irfft2(x_fft * kernel_fft, s=fft_size)
+    return out[..., pad:pad + h, pad:pad + w]
+
+
+def box_blur(x, size):
+    """Zero-padded mean filter of odd ``size`` over (C, H, W), via a summed-area table.
+
+    Cost is independent of ``size``; the table is accumulated in float64 so
+    small boxes keep their precision on large images.
+    """
+    r = size // 2
+    h, w = x.shape[-2:]
+    sat = F.pad(x.double(), (r + 1, r, r + 1, r)).cumsum(-2).cumsum(-1)
+    total = (sat[..., size:size + h, size:size + w] - sat[..., :h, size:size + w]
+             - sat[..., size:size + h, :w] + sat[..., :h, :w])
+    return (total / (size * size)).to(x.dtype)
+
+
+def fast_bokeh_blur(x, kernel_size):
+    """Approximate a round bokeh of diameter ``kernel_size`` with three stacked box blurs."""
+    # Three boxes of width b have per-axis variance (b^2 - 1) / 4, matching a
+    # disk of radius R when b ~= R
+    box = max(1, (kernel_size // 2) | 1)
+    for _ in range(3):
+        x = box_blur(x, box)
+    return x
+
+
+@lru_cache(maxsize=16)
+def create_ellipse_kernel(radius, device):
+    """Elliptical structuring element matching cv2.getStructuringElement(MORPH_ELLIPSE)."""
+    size = radius * 2 + 1
+    kernel = torch.zeros((size, size), dtype=torch.float32)
+    for i in range(size):
+        dy = i - radius
+        dx = int(round(np.sqrt(radius * radius - dy * dy)))
+        kernel[i, max(radius - dx, 0):min(radius + dx + 1, size)] = 1.0
+    return kernel.to(device)
+
+
+def dilate_mask(mask, radius):
+    """Binary dilation of a (B, H, W) bool mask on its own device."""
+    kernel = create_ellipse_kernel(radius, mask.device)
+    dilated = F.conv2d(mask.float().unsqueeze(1), kernel[None, None], padding=radius)
+    return dilated[:, 0] > 0.5
+
+
 def apply_depth_aware_blur(img_tensor, blur_mask_tensor, max_blur_strength, bokeh_shape,
                            highlight_threshold_low, highlight_threshold_high, highlight_factor,
                            in_focus_mask_fix):
@@ -127,6 +202,9 @@ def apply_depth_aware_blur(img_tensor, blur_mask_tensor, max_blur_strength, boke
     between the two nearest precomputed levels. In-focus pixels (blur_mask < 0.01) have their
     original values restored after blurring. The masked convolution zeroes out in-focus pixels
     before each level's convolution to prevent sharp edges from leaking into background bokeh.
+
+    ``img_tensor`` is a contiguous (B, 3, H, W) tensor and the result is returned in the same
+    layout; ``blur_mask_tensor`` and the returned masks are (B, H, W).
     """
     device = img_tensor.device
     in_focus_threshold = 0.01
@@ -135,24 +213,27 @@ def apply_depth_aware_blur(img_tensor, blur_mask_tensor, max_blur_strength, boke
     border_mask = torch.zeros_like(in_focus_mask)
 
     if in_focus_mask_fix > 0:
-        in_focus_mask_np = in_focus_mask.cpu().numpy().astype(np.uint8)
-        kernel_size_fix = in_focus_mask_fix * 2 + 1
-        kernel_fix = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size_fix, kernel_size_fix))
-        in_focus_mask_dilated_np = cv2.dilate(in_focus_mask_np, kernel_fix, iterations=1)
-        in_focus_mask_dilated = torch.from_numpy(in_focus_mask_dilated_np).to(device).bool()
+        in_focus_mask_dilated = dilate_mask(in_focus_mask, in_focus_mask_fix)
         border_mask = in_focus_mask_dilated & ~in_focus_mask
         out_of_focus_mask = out_of_focus_mask & ~in_focus_mask_dilated
         in_focus_mask = in_focus_mask_dilated
 
-    luminance = 0.299 * img_tensor[:, :, 0] + 0.587 * img_tensor[:, :, 1] + 0.114 * img_tensor[:, :, 2]
+    # Nothing to blur – skip the convolutions entirely
+    if not out_of_focus_mask.any():
+        return img_tensor, in_focus_mask.float(), out_of_focus_mask.float(), border_mask.float()
+
+    blur_region = (~in_focus_mask).float().unsqueeze(1)
     if highlight_factor > 0:
+        luminance = F.conv2d(img_tensor, _luma_kernel(device))[:, 0]
         v = (luminance - highlight_threshold_low) / (highlight_threshold_high - highlight_threshold_low + 1e-8)
-        v = torch.clamp(v, 0, 1)
-        weights = torch.exp(v * 10.0 * highlight_factor * np.log(2))
+        idx = v.clamp_(0, 1).mul_(HIGHLIGHT_LUT_SIZE - 1).round_().long()
+        weights = _highlight_lut(float(highlight_factor), device)[idx]
+        weighted_img = img_tensor * weights.unsqueeze(1)
     else:
-        weights = torch.ones_like(luminance)
-
-    weighted_img = img_tensor * weights.unsqueeze(-1)
+        # Uniform weights: the image is used as is and the weight channel is
+        # just the blur region
+        weights = None
+        weighted_img = img_tensor
 
     num_levels = 8
     max_kernel = int(max_blur_strength * 2) * 2 + 1
@@ -160,86 +241,169 @@ def apply_depth_aware_blur(img_tensor, blur_mask_tensor, max_blur_strength, boke
     kernel_sizes = np.linspace(1, max_kernel, num_levels).astype(int)
     kernel_sizes = [k if k % 2 == 1 else k + 1 for k in kernel_sizes]
 
-    masked_img = weighted_img.clone()
-    masked_img[in_focus_mask] = 0.0
-    masked_weights = weights.clone()
-    masked_weights[in_focus_mask] = 0.0
+    # Image and weights are blurred together as one 4-channel stack with the
+    # in-focus pixels zeroed out
+    if weights is None:
+        stacked = torch.cat([img_tensor * blur_region, blur_region], dim=1)
+    else:
+        stacked = torch.cat([weighted_img, weights.unsqueeze(1)], dim=1) * blur_region
+
+    # The stack's FFT is sized for the largest kernel so every level can reuse it
+    h, w = img_tensor.shape[-2:]
+    fft_size = (h + max_kernel - 1, w + max_kernel - 1)
+    stacked_fft = None
+    if max_kernel >= FFT_KERNEL_THRESHOLD and bokeh_shape != "fast":
+        stacked_fft = torch.fft.rfft2(stacked, s=fft_size)
+
+    # All direct-convolution levels are computed by a single grouped conv
+    direct_levels = {}
+    if bokeh_shape != "fast":
+        direct_sizes = tuple(sorted({int(k) for k in kernel_sizes if 1 < k < FFT_KERNEL_THRESHOLD}))
+        if direct_sizes:
+            weight = _stacked_bokeh_weights(direct_sizes, bokeh_shape, device)
+            # Channels are folded into the batch so the kernels are shared, not replicated
+            direct = F.conv2d(stacked.view(-1, 1, h, w), weight, padding=weight.shape[-1] // 2)
+            direct = direct.view(stacked.shape[0], 4, len(direct_sizes), h, w)
+            direct_levels = {size: direct[:, :, i] for i, size in enumerate(direct_sizes)}
+
+    if weights is None:
+        weights = blur_mask_tensor.new_ones(()).expand_as(blur_mask_tensor)
 
     blur_levels = []
     blur_weights_levels = []
     for kernel_size in kernel_sizes:
         if kernel_size <= 1:
-            blur_levels.append(weighted_img.clone())
-            blur_weights_levels.append(weights.clone())
+            # torch.stack below copies the levels, so no clone is needed
+            blur_levels.append(weighted_img)
+            blur_weights_levels.append(weights)
             continue
-        kernel_np = create_bokeh_kernel(kernel_size, bokeh_shape)
-        if kernel_np is None:
-            blur_levels.append(weighted_img.clone())
-            blur_weights_levels.append(weights.clone())
+        if bokeh_shape == "fast":
+            blurred = fast_bokeh_blur(stacked, int(kernel_size))
+            blur_levels.append(blurred[:, :3])
+            blur_weights_levels.append(blurred[:, 3])
             continue
-        kernel_torch = torch.from_numpy(kernel_np).to(device).float()
-        masked_img_4d = masked_img.permute(2, 0, 1).unsqueeze(0)
-        masked_weights_4d = masked_weights.unsqueeze(0).unsqueeze(0)
-        kernel_4d = kernel_torch.unsqueeze(0).unsqueeze(0)
-        pad = kernel_size // 2
-        blurred_weighted_4d = F.conv2d(masked_img_4d, kernel_4d.repeat(3, 1, 1, 1), padding=pad, groups=3)
-        blurred_weights_4d = F.conv2d(masked_weights_4d, kernel_4d, padding=pad)
-        blur_levels.append(blurred_weighted_4d.squeeze(0).permute(1, 2, 0))
-        blur_weights_levels.append(blurred_weights_4d.squeeze(0).squeeze(0))
+        if kernel_size >= FFT_KERNEL_THRESHOLD:
+            kernel_fft = _bokeh_kernel_fft(int(kernel_size), bokeh_shape, fft_size, device)
+            blurred = fft_conv2d(stacked_fft, kernel_fft, int(kernel_size), fft_size, (h, w)).clamp_(min=0)
+        else:
+            blurred = direct_levels[int(kernel_size)]
+        blur_levels.append(blurred[:, :3])
+        blur_weights_levels.append(blurred[:, 3])
 
     blur_mask_scaled = blur_mask_tensor * (num_levels - 1)
     level_indices = torch.clamp(torch.floor(blur_mask_scaled).long(), 0, num_levels - 2)
     blend_factor = blur_mask_scaled - level_indices.float()
-    blend_factor_3ch = blend_factor.unsqueeze(-1)
 
-    result_weighted = torch.zeros_like(weighted_img)
-    result_weights = torch.zeros_like(weights)
-    for i in range(num_levels - 1):
-        at_level = (level_indices == i).float()
-        blended_w = blur_levels[i] * (1 - blend_factor_3ch) + blur_levels[i + 1] * blend_factor_3ch
-        blended_wt = blur_weights_levels[i] * (1 - blend_factor) + blur_weights_levels[i + 1] * blend_factor
-        result_weighted += blended_w * at_level.unsqueeze(-1)
-        result_weights += blended_wt * at_level
+    # Gather each pixel's two neighbouring levels and blend them in one pass
+    levels_w = torch.stack(blur_levels, dim=0)
+    levels_wt = torch.stack(blur_weights_levels, dim=0)
+    idx_lo = level_indices.unsqueeze(0)
+    idx_lo_3ch = idx_lo.unsqueeze(2).expand(-1, -1, 3, -1, -1)
+    result_weighted = torch.lerp(levels_w.gather(0, idx_lo_3ch)[0],
+                                 levels_w.gather(0, idx_lo_3ch + 1)[0],
+                                 blend_factor.unsqueeze(1))
+    result_weights = torch.lerp(levels_wt.gather(0, idx_lo)[0],
+                                levels_wt.gather(0, idx_lo + 1)[0],
+                                blend_factor)
 
-    blurred = torch.clamp(result_weighted / (result_weights.unsqueeze(-1) + 1e-8), 0, 1)
+    # Normalise in full precision: the epsilon underflows in half
+    blurred = torch.clamp(result_weighted.float() / (result_weights.float().unsqueeze(1) + 1e-8), 0, 1)
 
-    result = blurred.clone()
-    result[in_focus_mask & ~border_mask] = img_tensor[in_focus_mask & ~border_mask]
-    result[border_mask] = img_tensor[border_mask]
+    # Restore the original pixels in the (dilated) in-focus zone, border included
+    result = torch.where((in_focus_mask | border_mask).unsqueeze(1), img_tensor, blurred)
 
     return result, in_focus_mask.float(), out_of_focus_mask.float(), border_mask.float()
 
 
-def _apply_dof_to_image(img, depth, focal_point, focus_falloff, focal_plane,
-                        blur_strength, bokeh_shape, highlight_threshold_low, highlight_threshold_high,
-                        highlight_factor, in_focus_mask_fix):
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    img_tensor = torch.from_numpy(img).float().to(device)
-    depth_tensor = torch.from_numpy(depth).float().to(device)
+def _dof_device():
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
 
+_HOST_STAGING: dict[tuple, torch.Tensor] = {}  # (shape, dtype) -> pinned download buffer
+
+
+def _copy_to_host(out, part):
+    """Copy a device result into the pageable ``out`` through a reused pinned buffer."""
+    if part.device.type != "cuda":
+        out.copy_(part)
+        return
+    key = (tuple(part.shape), part.dtype)
+    staging = _HOST_STAGING.get(key)
+    if staging is None:
+        if len(_HOST_STAGING) >= 8:
+            _HOST_STAGING.clear()
+        staging = _HOST_STAGING[key] = torch.empty(part.shape, dtype=part.dtype, pin_memory=True)
+    staging.copy_(part)
+    out.copy_(staging)
+
+
+@lru_cache(maxsize=8)
+def _use_half_precision(device):
+    """Run the blur convolutions in FP16 on GPUs with tensor cores (Volta and newer)."""
+    return device.type == "cuda" and torch.cuda.get_device_capability(device)[0] >= 7
+
+
+def _normalize_depth(depth_tensor):
+    """Collapse (B, H, W, C) depth maps to (B, H, W, 1), each normalised on its own range."""
     if depth_tensor.shape[-1] > 1:
         depth_tensor = depth_tensor.mean(dim=-1, keepdim=True)
+    depth_min = depth_tensor.amin(dim=(1, 2, 3), keepdim=True)
+    depth_max = depth_tensor.amax(dim=(1, 2, 3), keepdim=True)
+    return (depth_tensor - depth_min).div_(depth_max - depth_min + 1e-8)
+
 
-    depth_tensor = (depth_tensor - depth_tensor.min()) / (depth_tensor.max() - depth_tensor.min() + 1e-8)
+def _depth_blur_mask(depth_tensor, focal_point, focus_falloff, focal_plane):
+    """(B, H, W) blur amount for normalised (B, H, W, 1) depth.
 
-    hard_zone_min = focal_point - focal_plane
-    hard_zone_max = focal_point + focal_plane
+    The distance outside the hard focus zone [focal_point ± focal_plane], scaled by the falloff.
+    """
+    return ((depth_tensor - focal_point).abs_().sub_(focal_plane).clamp_(min=0)
+            .div_(focus_falloff + 1e-8).clamp_(0, 1).squeeze(-1))
 
-    blur_mask = torch.zeros_like(depth_tensor)
-    below = depth_tensor < hard_zone_min
-    blur_mask[below] = (hard_zone_min - depth_tensor[below]) / (focus_falloff + 1e-8)
-    above = depth_tensor > hard_zone_max
-    blur_mask[above] = (depth_tensor[above] - hard_zone_max) / (focus_falloff + 1e-8)
-    blur_mask = torch.clamp(blur_mask, 0, 1).squeeze()
 
-    result, in_focus_mask, out_of_focus_mask, border_mask = apply_depth_aware_blur(
-        img_tensor, blur_mask, blur_strength, bokeh_shape,
-        highlight_threshold_low, highlight_threshold_high, highlight_factor,
-        in_focus_mask_fix
-    )
+def _preview_depth(depth_tensor):
+    """Downscale (1, H, W, 1) depth to RAM preview size; returns the proxy and its scale."""
+    target = _preview_size(*depth_tensor.shape[1:3])
+    if target is None:
+        return depth_tensor, 1.0
+    small = F.interpolate(depth_tensor.permute(0, 3, 1, 2), size=target, mode="area")
+    return small.permute(0, 2, 3, 1), target[0] / depth_tensor.shape[1]
 
-    return (result.cpu().numpy(), blur_mask.cpu().numpy(),
-            in_focus_mask.cpu().numpy(), out_of_focus_mask.cpu().numpy(), border_mask.cpu().numpy())
+
+def _mask_preview(depth_tensor, scale, focal_point, focus_falloff, focal_plane,
+                  in_focus_mask_fix, preview_mode):
+    """Blur or in-focus mask preview built from depth alone, without running the blur."""
+    mask = _depth_blur_mask(depth_tensor, focal_point, focus_falloff, focal_plane)
+    if preview_mode == "in_focus_mask":
+        in_focus = mask < 0.01
+        if in_focus_mask_fix > 0:
+            in_focus = dilate_mask(in_focus, max(1, int(round(in_focus_mask_fix * scale))))
+        mask = in_focus.float()
+    return mask.unsqueeze(-1).expand(-1, -1, -1, 3)
+
+
+def _apply_dof_to_image(img_tensor, depth_tensor, focal_point, focus_falloff, focal_plane,
+                        blur_strength, bokeh_shape, highlight_threshold_low, highlight_threshold_high,
+                        highlight_factor, in_focus_mask_fix):
+    """
+    Depth of field for a (B, 3, H, W) image batch and its (B, H, W, 1) depth maps.
+
+    Depth must already be normalised by ``_normalize_depth``. Inputs are expected on the
+    compute device; the (B, H, W, 3) result and the four (B, H, W) masks are returned there too.
+    """
+    blur_mask = _depth_blur_mask(depth_tensor, focal_point, focus_falloff, focal_plane)
+
+    # Convolutions drop to FP16 under autocast; FFTs, masks and the final
+    # composite stay in FP32
+    with torch.autocast(img_tensor.device.type, dtype=torch.float16,
+                        enabled=_use_half_precision(img_tensor.device)):
+        result, in_focus_mask, out_of_focus_mask, border_mask = apply_depth_aware_blur(
+            img_tensor, blur_mask, blur_strength, bokeh_shape,
+            highlight_threshold_low, highlight_threshold_high, highlight_factor,
+            in_focus_mask_fix
+        )
+
+    return result.permute(0, 2, 3, 1), blur_mask, in_focus_mask, out_of_focus_mask, border_mask
 
 
 class CameraDepthOfFieldC:
@@ -254,7 +418,7 @@ class CameraDepthOfFieldC:
                 "focal_plane": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 0.5, "step": 0.01, "round": 0.001}),
                 "focus_falloff": ("FLOAT", {"default": 0.25, "min": 0.0, "max": 1.0, "step": 0.01, "round": 0.001}),
                 "in_focus_mask_fix": ("INT", {"default": 0, "min": 0, "max": 10, "step": 1}),
-                "bokeh_shape": (["circle", "hexagon", "octagon"], {"default": "circle"}),
+                "bokeh_shape": (["circle", "hexagon", "octagon", "fast"], {"default": "circle", "tooltip": "'fast' approximates a soft round bokeh with stacked box blurs; its cost does not grow with blur_strength."}),
                 "highlight_factor": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 1.0, "step": 0.05, "round": 0.01}),
                 "highlight_threshold_low": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 1.0, "step": 0.05, "round": 0.01}),
                 "highlight_threshold_high": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.05, "round": 0.01}),
@@ -269,24 +433,46 @@ class CameraDepthOfFieldC:
     FUNCTION = "apply_dof"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def apply_dof(self, image, depth_map, focal_point, blur_strength, focus_falloff, focal_plane,
                   in_focus_mask_fix, bokeh_shape, highlight_factor, highlight_threshold_low,
                   highlight_threshold_high, preview_mode, apply_type,
                   unique_id=None, prompt=None, extra_pnginfo=None):
 
         if unique_id:
-            uid = str(unique_id)
-            _clear_all(uid)
+            # Keep the last slider values so a re-run starts where the user left off,
+            # unless the widget inputs themselves changed since
+            _clear_flags(str(unique_id), (focal_point, focus_falloff, focal_plane, blur_strength,
+                                          in_focus_mask_fix, bokeh_shape, highlight_factor,
+                                          highlight_threshold_low, highlight_threshold_high,
+                                          preview_mode))
 
         if unique_id and _check_and_clear_flag(str(unique_id), "skip"):
-            batch_size = image.shape[0]
-            empty = torch.zeros((batch_size, image.shape[1], image.shape[2]))
-            full = torch.ones((batch_size, image.shape[1], image.shape[2]))
+            shape = (image.shape[0], image.shape[1], image.shape[2])
+            empty = torch.zeros(shape)
+            full = torch.ones(shape)
             return (image, empty, full, empty, empty)
 
-        img_np = image.cpu().numpy()
-        depth_np = depth_map.cpu().numpy()
-        batch_size = img_np.shape[0]
+        device = _dof_device()
+        batch_size = image.shape[0]
+
+        use_pinned = device.type == "cuda"
+
+        def _to_device(t):
+            # Stage host tensors in pinned memory so the upload can run asynchronously
+            if use_pinned and t.device.type == "cpu":
+                return t.pin_memory().to(device, non_blocking=True)
+            return t.to(device)
+
+        def _upload(start, stop):
+            img_t = _to_device(image[start:stop]).float().permute(0, 3, 1, 2).contiguous()
+            # Depth is constant across preview ticks, so it is normalised once here
+            return img_t, _normalize_depth(_to_device(depth_map[start:stop]).float())
+
+        # Results are written straight into preallocated host outputs
+        h, w = image.shape[1], image.shape[2]
+        outputs = (torch.empty((batch_size, h, w, 3)),) + tuple(
+            torch.empty((batch_size, h, w)) for _ in range(4))
 
         # compute_params excludes preview_mode — 9 elements
         def _run(img, depth, cp):
@@ -300,44 +486,47 @@ class CameraDepthOfFieldC:
                                preview_mode)
 
         if not unique_id or apply_type == "auto_apply":
-            results, blur_masks, in_focus_masks, out_of_focus_masks, border_masks = [], [], [], [], []
             cp = (focal_point, focus_falloff, focal_plane, blur_strength,
                   in_focus_mask_fix, bokeh_shape, highlight_factor,
                   highlight_threshold_low, highlight_threshold_high)
-            for b in range(batch_size):
-                result, bm, ifm, ofm, borm = _run(img_np[b], depth_np[b], cp)
-                results.append(result); blur_masks.append(bm)
-                in_focus_masks.append(ifm); out_of_focus_masks.append(ofm); border_masks.append(borm)
-            return (
-                torch.from_numpy(np.stack(results)).float(),
-                torch.from_numpy(np.stack(blur_masks)).float(),
-                torch.from_numpy(np.stack(in_focus_masks)).float(),
-                torch.from_numpy(np.stack(out_of_focus_masks)).float(),
-                torch.from_numpy(np.stack(border_masks)).float(),
-            )
+            # Whole frames go through together, in chunks that bound the memory
+            # held by the blur levels
+            chunk = max(1, BATCH_PIXEL_BUDGET // (image.shape[1] * image.shape[2]))
+            for i in range(0, batch_size, chunk):
+                for out, part in zip(outputs, _run(*_upload(i, i + chunk), cp)):
+                    _copy_to_host(out[i:i + chunk], part)
+            return outputs
 
         uid = str(unique_id)
-        results, blur_masks, in_focus_masks, out_of_focus_masks, border_masks = [], [], [], [], []
-
-        for b in range(batch_size):
-            img = img_np[b]
-            depth = depth_np[b]
+        result_out, blur_out, in_focus_out, out_of_focus_out, border_out = outputs
 
-            cur = _defaults(uid)
-            cp = cur[:9]
-            pm = cur[9]
-
-            # Skip recompute if only preview_mode changed
-            cached = _LAST_COMPUTE.get(uid)
-            if cached and cached[0] == cp:
-                result_np, blur_mask_np, ifm_np, ofm_np, bm_np = cached[1:]
+        def _preview(img, depth, depth_small, scale, cur):
+            cp, pm = cur[:9], cur[9]
+            t0 = time.time()
+            if pm == "image":
+                # Skip recompute if only preview_mode changed
+                cached = _LAST_COMPUTE.get(uid)
+                if cached and cached[0] == cp:
+                    preview = cached[1]
+                else:
+                    outs = _run(img, depth, cp)
+                    _LAST_COMPUTE[uid] = (cp, *outs)
+                    preview = outs[0]
             else:
-                t0 = time.time()
-                result_np, blur_mask_np, ifm_np, ofm_np, bm_np = _run(img, depth, cp)
-                _set_processing_time(uid, int((time.time() - t0) * 1000))
-                _LAST_COMPUTE[uid] = (cp, result_np, blur_mask_np, ifm_np, ofm_np, bm_np)
+                # Masks depend on depth alone: skip the blur and work at preview resolution
+                fp, ff, fpl, _, ifmf = cp[:5]
+                preview = _mask_preview(depth_small, scale, fp, ff, fpl, ifmf, pm)
+            _set_processing_time(uid, int((time.time() - t0) * 1000))
+            _send_ram_preview(preview, uid)
 
-            _send_ram_preview(_make_preview_tensor(result_np, blur_mask_np, ifm_np, pm), uid)
+        for b in range(batch_size):
+            # Upload once; every preview tick reuses the device copies
+            img, depth = _upload(b, b + 1)
+            depth_small, scale = _preview_depth(depth)
+            # Cached results belong to the previous frame
+            _LAST_COMPUTE.pop(uid, None)
+
+            _preview(img, depth, depth_small, scale, _defaults(uid))
 
             final_params = None
             while True:
@@ -348,48 +537,28 @@ class CameraDepthOfFieldC:
                     if _check_and_clear_flag(uid, "apply"):
                         final_params = _defaults(uid); break
                     if _check_and_clear_flag(uid, "skip"):
-                        results.append(img)
-                        blur_masks.append(np.zeros((img.shape[0], img.shape[1])))
-                        in_focus_masks.append(np.ones((img.shape[0], img.shape[1])))
-                        out_of_focus_masks.append(np.zeros((img.shape[0], img.shape[1])))
-                        border_masks.append(np.zeros((img.shape[0], img.shape[1])))
+                        result_out[b].copy_(image[b])
+                        blur_out[b].zero_(); out_of_focus_out[b].zero_(); border_out[b].zero_()
+                        in_focus_out[b].fill_(1.0)
                         final_params = None; break
-                    time.sleep(0.05)
+                    _wait_for_update(uid)
                 if not triggered:
                     break
 
-                cur = _defaults(uid)
-                cp = cur[:9]
-                pm = cur[9]
-
-                cached = _LAST_COMPUTE.get(uid)
-                if cached and cached[0] == cp:
-                    result_np, blur_mask_np, ifm_np, ofm_np, bm_np = cached[1:]
-                else:
-                    t0 = time.time()
-                    result_np, blur_mask_np, ifm_np, ofm_np, bm_np = _run(img, depth, cp)
-                    _set_processing_time(uid, int((time.time() - t0) * 1000))
-                    _LAST_COMPUTE[uid] = (cp, result_np, blur_mask_np, ifm_np, ofm_np, bm_np)
-
-                _send_ram_preview(_make_preview_tensor(result_np, blur_mask_np, ifm_np, pm), uid)
+                _preview(img, depth, depth_small, scale, _defaults(uid))
 
             if final_params is not None:
                 cp_final = final_params[:9]
                 cached = _LAST_COMPUTE.get(uid)
                 if cached and cached[0] == cp_final:
-                    result, bm, ifm, ofm, borm = cached[1:]
+                    outs = cached[1:]
                 else:
-                    result, bm, ifm, ofm, borm = _run(img, depth, cp_final)
-                results.append(result); blur_masks.append(bm)
-                in_focus_masks.append(ifm); out_of_focus_masks.append(ofm); border_masks.append(borm)
-
-        return (
-            torch.from_numpy(np.stack(results)).float(),
-            torch.from_numpy(np.stack(blur_masks)).float(),
-            torch.from_numpy(np.stack(in_focus_masks)).float(),
-            torch.from_numpy(np.stack(out_of_focus_masks)).float(),
-            torch.from_numpy(np.stack(border_masks)).float(),
-        )
+                    outs = _run(img, depth, cp_final)
+                # Only the applied result leaves the device
+                for out, part in zip(outputs, outs):
+                    _copy_to_host(out[b:b + 1], part)
+
+        return outputs
 
 
 NODE_CLASS_MAPPINGS = {"CameraDepthDOF": CameraDepthOfFieldC}
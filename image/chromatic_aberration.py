@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -136,6 +136,7 @@ class ChromaticAberrationC:
     FUNCTION = "apply_effect"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def apply_effect(self, image, offset_x, offset_y, red_scale, blue_scale,
                      center_x, center_y, falloff, apply_type, unique_id=None):
         if unique_id:
@@ -1,70 +1,53 @@
 import torch
-import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.control_store import ControlStore
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
-_CONTROL_STORE: dict[str, dict] = {}
-_CONTROL_LOCK = threading.Lock()
+_STORE = ControlStore()
+
+def _wait_for_update(node_id: str) -> None:
+    _STORE.wait_for_update(node_id)
 
 def _set_params(node_id: str, contrast: float) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        new_params = (contrast,)
-        if entry.get("params") != new_params:
-            entry["params"] = new_params
-            entry["params_changed"] = True
-            entry["processing_complete"] = False
+    _STORE.set_params(node_id, (contrast,))
 
 def _get_params(node_id: str, contrast: float) -> tuple[float]:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return entry.get("params", (contrast,))
+    return _STORE.get_params(node_id, (contrast,))
 
 def _check_and_clear_params_changed(node_id: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        if entry.get("params_changed"):
-            entry["params_changed"] = False
-            return True
-        return False
+    return _STORE.check_and_clear_params_changed(node_id)
 
 def _set_processing_time(node_id: str, ms: int) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry["processing_time_ms"] = ms
-        entry["processing_complete"] = True
+    _STORE.set_processing_time(node_id, ms)
+
+def _touch_processing_time(node_id: str) -> None:
+    _STORE.touch_processing_time(node_id)
 
 def _get_processing_time(node_id: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return (entry.get("processing_time_ms", 0), entry.get("processing_complete", False))
+    return _STORE.get_processing_time(node_id)
 
 def _set_flag(node_id: str, flag: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry.setdefault("flags", {})[flag] = True
+    _STORE.set_flag(node_id, flag)
 
 def _check_and_clear_flag(node_id: str, flag: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        flags = entry.get("flags", {})
-        if flags.get(flag):
-            flags[flag] = False
-            return True
-        return False
+    return _STORE.check_and_clear_flag(node_id, flag)
+
+def _clear_flags(node_id: str, contrast: float) -> None:
+    _STORE.clear_flags(node_id, (contrast,))
 
 def _clear_all(node_id: str) -> None:
-    with _CONTROL_LOCK:
-        _CONTROL_STORE.pop(node_id, None)
+    _STORE.clear_all(node_id)
 
 def _apply(image, contrast):
+    if contrast == 0.0:
+        return image
     pivot = 0.5
-    result = pivot + (image - pivot) * (1 + contrast / 100)
-    return torch.clamp(result, 0.0, 1.0)
+    # One output allocation; the rest runs in place on it (the input is never mutated)
+    return image.sub(pivot).mul_(1 + contrast / 100).add_(pivot).clamp_(0.0, 1.0)
+
+def _apply_centered(centered, contrast, out):
+    """Preview variant of ``_apply`` working on ``image - 0.5`` and writing into ``out``."""
+    return torch.mul(centered, 1 + contrast / 100, out=out).add_(0.5).clamp_(0.0, 1.0)
 
 class ContrastC:
     @classmethod
@@ -84,10 +67,12 @@ class ContrastC:
     FUNCTION = "contrast"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def contrast(self, image, contrast, apply_type, unique_id=None):
         if unique_id:
-            uid = str(unique_id)
-            _clear_all(uid)
+            # Keep the last slider values so a re-run starts where the user left off,
+            # unless the widget input itself changed since
+            _clear_flags(str(unique_id), contrast)
 
         if unique_id and _check_and_clear_flag(str(unique_id), "skip"):
             return {"result": (image,)}
@@ -96,11 +81,16 @@ class ContrastC:
             uid = str(unique_id)
 
             if apply_type == "apply_all":
+                # Preview ticks reuse the centred image and one output buffer
+                centered = image.sub(0.5)
+                buf = torch.empty_like(image)
+
                 cur_contrast = _get_params(uid, contrast)[0]
                 t0 = time.time()
-                preview = _apply(image, cur_contrast)
+                preview = _apply_centered(centered, cur_contrast, buf)
                 _set_processing_time(uid, int((time.time() - t0) * 1000))
                 _send_ram_preview(preview, uid)
+                last_contrast = cur_contrast
 
                 while True:
                     triggered = False
@@ -113,18 +103,24 @@ class ContrastC:
                             break
                         if _check_and_clear_flag(uid, "skip"):
                             return {"result": (image,)}
-                        time.sleep(0.05)
+                        _wait_for_update(uid)
 
                     if not triggered:
                         break
 
                     cur_contrast = _get_params(uid, contrast)[0]
+                    if cur_contrast == last_contrast:
+                        # Slider moved and came back – the preview on screen is current
+                        _touch_processing_time(uid)
+                        continue
                     t0 = time.time()
-                    preview = _apply(image, cur_contrast)
+                    preview = _apply_centered(centered, cur_contrast, buf)
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last_contrast = cur_contrast
 
-                result = _apply(image, final_contrast)
+                # The last preview already holds the applied values
+                result = buf if final_contrast == last_contrast else _apply(image, final_contrast)
 
             else:
                 batch_size = image.shape[0]
@@ -132,12 +128,15 @@ class ContrastC:
 
                 for i in range(batch_size):
                     single = image[i:i+1]
+                    centered = single.sub(0.5)
+                    buf = torch.empty_like(single)
 
                     cur_contrast = _get_params(uid, contrast)[0]
                     t0 = time.time()
-                    preview = _apply(single, cur_contrast)
+                    preview = _apply_centered(centered, cur_contrast, buf)
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last_contrast = cur_contrast
 
                     final_contrast = None
                     while True:
@@ -153,19 +152,23 @@ class ContrastC:
                                 result_list.append(single)
                                 final_contrast = None
                                 break
-                            time.sleep(0.05)
+                            _wait_for_update(uid)
 
                         if not triggered:
                             break
 
                         cur_contrast = _get_params(uid, contrast)[0]
+                        if cur_contrast == last_contrast:
+                            _touch_processing_time(uid)
+                            continue
                         t0 = time.time()
-                        preview = _apply(single, cur_contrast)
+                        preview = _apply_centered(centered, cur_contrast, buf)
                         _set_processing_time(uid, int((time.time() - t0) * 1000))
                         _send_ram_preview(preview, uid)
+                        last_contrast = cur_contrast
 
                     if final_contrast is not None:
-                        result_list.append(_apply(single, final_contrast))
+                        result_list.append(buf if final_contrast == last_contrast else _apply(single, final_contrast))
 
                 result = torch.cat(result_list, dim=0)
         else:
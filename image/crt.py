@@ -3,7 +3,7 @@ import torch.nn.functional as F
 import threading
 import time
 import math
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -367,6 +367,7 @@ class CRTEffect:
     FUNCTION = "apply_crt"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def apply_crt(self, image,
                   beam_intensity, beam_position, beam_width, beam_glow,
                   scanline_intensity, scanline_spacing,
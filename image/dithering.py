@@ -1,72 +1,56 @@
 import torch
-import threading
 import time
 import numpy as np
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.control_store import ControlStore
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
-_CONTROL_STORE: dict[str, dict] = {}
-_CONTROL_LOCK = threading.Lock()
+try:
+    from scipy.ndimage import gaussian_filter
+except ImportError:
+    gaussian_filter = None
+
+_STORE = ControlStore()
+
+def _wait_for_update(node_id: str) -> None:
+    _STORE.wait_for_update(node_id)
 
 def _set_params(node_id: str, dither_method: str, r_levels: int, g_levels: int,
                 b_levels: int, dither_scale: float) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        new_params = (dither_method, r_levels, g_levels, b_levels, dither_scale)
-        if entry.get("params") != new_params:
-            entry["params"] = new_params
-            entry["params_changed"] = True
-            entry["processing_complete"] = False
+    _STORE.set_params(node_id, (dither_method, r_levels, g_levels, b_levels, dither_scale))
 
 def _get_params(node_id: str, dither_method: str, r_levels: int, g_levels: int,
                 b_levels: int, dither_scale: float) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return entry.get("params", (dither_method, r_levels, g_levels, b_levels, dither_scale))
+    return _STORE.get_params(node_id, (dither_method, r_levels, g_levels, b_levels, dither_scale))
 
 def _check_and_clear_params_changed(node_id: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        if entry.get("params_changed"):
-            entry["params_changed"] = False
-            return True
-        return False
+    return _STORE.check_and_clear_params_changed(node_id)
 
 def _set_processing_time(node_id: str, ms: int) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry["processing_time_ms"] = ms
-        entry["processing_complete"] = True
+    _STORE.set_processing_time(node_id, ms)
+
+def _touch_processing_time(node_id: str) -> None:
+    _STORE.touch_processing_time(node_id)
 
 def _get_processing_time(node_id: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return (entry.get("processing_time_ms", 0), entry.get("processing_complete", False))
+    return _STORE.get_processing_time(node_id)
 
 def _set_flag(node_id: str, flag: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry.setdefault("flags", {})[flag] = True
+    _STORE.set_flag(node_id, flag)
 
 def _check_and_clear_flag(node_id: str, flag: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        flags = entry.get("flags", {})
-        if flags.get(flag):
-            flags[flag] = False
-            return True
-        return False
+    return _STORE.check_and_clear_flag(node_id, flag)
 
 def _clear_all(node_id: str) -> None:
-    with _CONTROL_LOCK:
-        _CONTROL_STORE.pop(node_id, None)
+    _STORE.clear_all(node_id)
 
 class DitherC:
     _bayer_matrix_cache = {}
     _blue_noise_cache = {}
+    # Device copies and coordinate grids, reused across preview ticks
+    _bayer_tensor_cache = {}
+    _blue_noise_tensor_cache = {}
+    _coord_cache = {}
+    _levels_cache = {}
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -89,15 +73,22 @@ class DitherC:
 
     @staticmethod
     def generate_bayer_matrix(n):
-        if n == 1:
-            return np.array([[0]], dtype=np.float32)
+        """n x n Bayer index matrix (n a power of two), in closed form.
+
+        Each recursion level of M(2n) = [[4M, 4M+2], [4M+3, 4M+1]] contributes the
+        two bits (x ^ y, y) of one coordinate bit, from the most significant down.
+        """
         if n in DitherC._bayer_matrix_cache:
             return DitherC._bayer_matrix_cache[n]
-        smaller = DitherC.generate_bayer_matrix(n // 2)
-        result = np.vstack([
-            np.hstack([4 * smaller, 4 * smaller + 2]),
-            np.hstack([4 * smaller + 3, 4 * smaller + 1])
-        ]).astype(np.float32)
+        bits = n.bit_length() - 1
+        y, x = np.indices((n, n))
+        xor = x ^ y
+        result = np.zeros((n, n), dtype=np.int64)
+        for level in range(bits):
+            shift = bits - 1 - level
+            result |= ((xor >> shift) & 1) << (2 * level + 1)
+            result |= ((y >> shift) & 1) << (2 * level)
+        result = result.astype(np.float32)
         DitherC._bayer_matrix_cache[n] = result
         return result
 
@@ -105,80 +96,122 @@ class DitherC:
     def generate_blue_noise(seed=0):
         if seed in DitherC._blue_noise_cache:
             return DitherC._blue_noise_cache[seed]
+        if gaussian_filter is None:
+            raise ImportError("blue_noise dithering requires scipy")
         np.random.seed(seed)
         size = 256
-        blue_noise = np.zeros((4, size, size), dtype=np.uint8)
-        for ch in range(4):
-            white = np.random.rand(size, size)
-            bn = white.copy()
-            for _ in range(5):
-                from scipy.ndimage import gaussian_filter
-                smooth = gaussian_filter(bn, sigma=2.0)
-                bn = white - 0.7 * smooth
-                bn = (bn - bn.min()) / (bn.max() - bn.min() + 1e-8)
-            blue_noise[ch] = (bn * 255).astype(np.uint8)
+        # All four channels at once; sigma 0 on the channel axis keeps them independent
+        white = np.random.rand(4, size, size)
+        bn = white.copy()
+        for _ in range(5):
+            smooth = gaussian_filter(bn, sigma=(0, 2.0, 2.0))
+            bn = white - 0.7 * smooth
+            bn_min = bn.min(axis=(1, 2), keepdims=True)
+            bn_max = bn.max(axis=(1, 2), keepdims=True)
+            bn = (bn - bn_min) / (bn_max - bn_min + 1e-8)
+        blue_noise = (bn * 255).astype(np.uint8)
         DitherC._blue_noise_cache[seed] = blue_noise
         return blue_noise
 
+    @staticmethod
+    def _device_bayer(device):
+        bayer_t = DitherC._bayer_tensor_cache.get(device)
+        if bayer_t is None:
+            bayer_t = torch.as_tensor(DitherC.generate_bayer_matrix(8), device=device)
+            DitherC._bayer_tensor_cache[device] = bayer_t
+        return bayer_t
+
+    @staticmethod
+    def _device_blue_noise(device):
+        blue_noise_t = DitherC._blue_noise_tensor_cache.get(device)
+        if blue_noise_t is None:
+            blue_noise_t = torch.as_tensor(DitherC.generate_blue_noise(seed=0), device=device).float()
+            DitherC._blue_noise_tensor_cache[device] = blue_noise_t
+        return blue_noise_t
+
+    @staticmethod
+    def _scaled_coords(height, width, dither_scale, device):
+        """(H, 1) and (1, W) int32 pixel coordinates divided by ``dither_scale``."""
+        key = (height, width, dither_scale, device)
+        coords = DitherC._coord_cache.get(key)
+        if coords is None:
+            if len(DitherC._coord_cache) >= 16:
+                DitherC._coord_cache.clear()
+            y_coords = (torch.arange(height, device=device, dtype=torch.int32).view(height, 1) / dither_scale).int()
+            x_coords = (torch.arange(width, device=device, dtype=torch.int32).view(1, width) / dither_scale).int()
+            coords = DitherC._coord_cache[key] = (y_coords, x_coords)
+        return coords
+
+    @staticmethod
+    def _levels_tensor(levels_per_channel, image):
+        key = (tuple(max(2, l) for l in levels_per_channel), image.device, image.dtype)
+        levels = DitherC._levels_cache.get(key)
+        if levels is None:
+            if len(DitherC._levels_cache) >= 64:
+                DitherC._levels_cache.clear()
+            levels = DitherC._levels_cache[key] = torch.tensor(key[0], device=image.device, dtype=image.dtype)
+        return levels
+
+    @staticmethod
+    def _quantize(image, levels_per_channel, threshold=None):
+        """Round RGB to per-channel levels, after adding an optional (H, W, 3) threshold.
+
+        All three channels are processed in one pass; alpha is passed through.
+        """
+        scale = DitherC._levels_tensor(levels_per_channel, image) - 1
+        rgb = image[..., :3]
+        if threshold is not None:
+            rgb = rgb + threshold
+        # One allocation, then in place; floor(x + 0.5) keeps the round-half-up ties
+        quantized = rgb.mul(scale).add_(0.5).floor_().mul_(scale.reciprocal()).clamp_(0.0, 1.0)
+        if image.shape[-1] > 3:
+            quantized = torch.cat([quantized, image[..., 3:]], dim=-1)
+        return quantized
+
     @staticmethod
     def posterize_no_dither(image, levels_per_channel):
-        result = image.clone()
-        for c in range(3):
-            levels = max(2, levels_per_channel[c])
-            ch = result[:, :, :, c]
-            result[:, :, :, c] = torch.clamp(torch.floor(ch * (levels - 1) + 0.5) / (levels - 1), 0, 1)
-        return result
+        return DitherC._quantize(image, levels_per_channel)
+
+    @staticmethod
+    def _pattern(kind, height, width, dither_scale, device):
+        """Level-independent (H, W, 1 or 3) threshold offsets for ``kind``.
+
+        Built per call from the cached base tile and coordinate vectors, so no
+        image-sized tensor outlives the dither pass.
+        """
+        y_coords, x_coords = DitherC._scaled_coords(height, width, dither_scale, device)
+        if kind == "bayer":
+            bayer_t = DitherC._device_bayer(device)
+            bayer_vals = bayer_t[y_coords % 8, x_coords % 8].unsqueeze(-1)
+            return (bayer_vals - 32.5) / 64.0
+        if kind == "arithmetic_add":
+            channel_offsets = torch.arange(3, device=device, dtype=torch.int32) * 67
+            mask = (((x_coords.unsqueeze(-1) + channel_offsets) + y_coords.unsqueeze(-1) * 236) * 119) & 255
+            return (mask.float() - 128.0) / 256.0
+        blue_noise_t = DitherC._device_blue_noise(device)
+        noise_vals = blue_noise_t[:3, y_coords % 256, x_coords % 256].permute(1, 2, 0)
+        return (noise_vals - 128.0) / 257.0
 
     @staticmethod
     def bayer_dither(image, levels_per_channel, dither_scale=1.0):
-        batch_size, height, width, _ = image.shape
-        device = image.device
-        bayer = DitherC.generate_bayer_matrix(8)
-        bayer_t = torch.from_numpy(bayer).to(device).float()
-        result = image.clone()
-        for c in range(3):
-            levels = max(2, levels_per_channel[c])
-            y_coords = torch.arange(height, device=device, dtype=torch.int32).view(height, 1).expand(height, width)
-            x_coords = torch.arange(width, device=device, dtype=torch.int32).view(1, width).expand(height, width)
-            bayer_y = (y_coords / dither_scale).int() % 8
-            bayer_x = (x_coords / dither_scale).int() % 8
-            bayer_vals = bayer_t[bayer_y, bayer_x]
-            threshold = (bayer_vals - 32.5) / 64.0 / levels
-            dithered = result[:, :, :, c] + threshold.unsqueeze(0)
-            result[:, :, :, c] = torch.clamp(torch.floor(dithered * (levels - 1) + 0.5) / (levels - 1), 0, 1)
-        return result
+        _, height, width, _ = image.shape
+        pattern = DitherC._pattern("bayer", height, width, dither_scale, image.device)
+        threshold = pattern / DitherC._levels_tensor(levels_per_channel, image)
+        return DitherC._quantize(image, levels_per_channel, threshold)
 
     @staticmethod
     def arithmetic_add_dither(image, levels_per_channel, dither_scale=1.0):
         _, height, width, _ = image.shape
-        device = image.device
-        result = image.clone()
-        for c in range(3):
-            levels = max(2, levels_per_channel[c])
-            y_coords = (torch.arange(height, device=device, dtype=torch.int32).view(height, 1) / dither_scale).int().expand(height, width)
-            x_coords = (torch.arange(width, device=device, dtype=torch.int32).view(1, width) / dither_scale).int().expand(height, width)
-            mask = (((x_coords + c * 67) + y_coords * 236) * 119) & 255
-            threshold = (mask.float() - 128.0) / 256.0 / levels
-            dithered = result[:, :, :, c] + threshold.unsqueeze(0)
-            result[:, :, :, c] = torch.clamp(torch.floor(dithered * (levels - 1) + 0.5) / (levels - 1), 0, 1)
-        return result
+        pattern = DitherC._pattern("arithmetic_add", height, width, dither_scale, image.device)
+        threshold = pattern / DitherC._levels_tensor(levels_per_channel, image)
+        return DitherC._quantize(image, levels_per_channel, threshold)
 
     @staticmethod
     def blue_noise_dither(image, levels_per_channel, dither_scale=1.0):
         _, height, width, _ = image.shape
-        device = image.device
-        blue_noise = DitherC.generate_blue_noise(seed=0)
-        blue_noise_t = torch.from_numpy(blue_noise).to(device).float()
-        result = image.clone()
-        for c in range(3):
-            levels = max(2, levels_per_channel[c])
-            y_coords = (torch.arange(height, device=device, dtype=torch.int32).view(height, 1) / dither_scale).int() % 256
-            x_coords = (torch.arange(width, device=device, dtype=torch.int32).view(1, width) / dither_scale).int() % 256
-            noise_vals = blue_noise_t[c, y_coords, x_coords]
-            threshold = (noise_vals - 128.0) / 257.0 / levels
-            dithered = result[:, :, :, c] + threshold.unsqueeze(0)
-            result[:, :, :, c] = torch.clamp(torch.floor(dithered * (levels - 1) + 0.5) / (levels - 1), 0, 1)
-        return result
+        pattern = DitherC._pattern("blue_noise", height, width, dither_scale, image.device)
+        threshold = pattern / DitherC._levels_tensor(levels_per_channel, image)
+        return DitherC._quantize(image, levels_per_channel, threshold)
 
     @staticmethod
     def apply_dither(image, dither_method, r_levels, g_levels, b_levels, dither_scale=1.0):
@@ -193,6 +226,7 @@ class DitherC:
             return DitherC.blue_noise_dither(image, levels, dither_scale)
         return image
 
+    @_flushes_previews
     def dither(self, image, dither_method, r_levels, g_levels, b_levels, dither_scale, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
@@ -210,6 +244,7 @@ class DitherC:
                 preview = self.apply_dither(image, *cur)
                 _set_processing_time(uid, int((time.time() - t0) * 1000))
                 _send_ram_preview(preview, uid)
+                last = cur
 
                 while True:
                     triggered = False
@@ -222,18 +257,23 @@ class DitherC:
                             break
                         if _check_and_clear_flag(uid, "skip"):
                             return {"result": (image,)}
-                        time.sleep(0.05)
+                        _wait_for_update(uid)
 
                     if not triggered:
                         break
 
                     cur = _get_params(uid, dither_method, r_levels, g_levels, b_levels, dither_scale)
+                    if cur == last:
+                        _touch_processing_time(uid)
+                        continue
                     t0 = time.time()
                     preview = self.apply_dither(image, *cur)
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
-                result = self.apply_dither(image, *final)
+                # The last preview already holds the applied values
+                result = preview if final == last else self.apply_dither(image, *final)
 
             else:
                 batch_size = image.shape[0]
@@ -247,6 +287,7 @@ class DitherC:
                     preview = self.apply_dither(single, *cur)
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
                     final = None
                     while True:
@@ -262,19 +303,23 @@ class DitherC:
                                 result_list.append(single)
                                 final = None
                                 break
-                            time.sleep(0.05)
+                            _wait_for_update(uid)
 
                         if not triggered:
                             break
 
                         cur = _get_params(uid, dither_method, r_levels, g_levels, b_levels, dither_scale)
+                        if cur == last:
+                            _touch_processing_time(uid)
+                            continue
                         t0 = time.time()
                         preview = self.apply_dither(single, *cur)
                         _set_processing_time(uid, int((time.time() - t0) * 1000))
                         _send_ram_preview(preview, uid)
+                        last = cur
 
                     if final is not None:
-                        result_list.append(self.apply_dither(single, *final))
+                        result_list.append(preview if final == last else self.apply_dither(single, *final))
 
                 result = torch.cat(result_list, dim=0)
         else:
@@ -1,7 +1,7 @@
 import torch
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -62,8 +62,10 @@ def _clear_all(node_id: str) -> None:
         _CONTROL_STORE.pop(node_id, None)
 
 def _apply(image, exposure):
-    result = image * (2 ** exposure)
-    return torch.clamp(result, 0.0, 1.0)
+    if exposure == 0.0:
+        return image
+    # Clamp in place on the freshly multiplied tensor (the input is never mutated)
+    return image.mul(2 ** exposure).clamp_(0.0, 1.0)
 
 class ExposureC:
     @classmethod
@@ -83,6 +85,7 @@ class ExposureC:
     FUNCTION = "exposure"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def exposure(self, image, exposure, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
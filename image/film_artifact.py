@@ -4,7 +4,7 @@ import time
 import math
 import pickle
 from pathlib import Path
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -588,6 +588,7 @@ class FilmArtifactsC:
     FUNCTION = "film_artifacts"
     CATEGORY = "WtlNodes/image"
     
+    @_flushes_previews
     def film_artifacts(self, image, intensity, seed, scratch_density, scratch_max_length,
                       scratch_max_width, dust_density, dust_max_size, hair_density, hair_max_length,
                       light_leak_intensity, vignette_strength, apply_type, unique_id=None):
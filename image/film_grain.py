@@ -2,7 +2,7 @@ import torch
 import threading
 import time
 import math
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -138,6 +138,7 @@ class FilmGrainC:
     FUNCTION = "film_grain"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def film_grain(self, image, intensity, grain_size, monochrome, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
@@ -1,101 +1,98 @@
 import torch
-import cv2
-import threading
+import torch.nn.functional as F
 import time
-from ..helper.ram_preview import _send_ram_preview
+from functools import lru_cache
+from ..helper.control_store import ControlStore
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
-_CONTROL_STORE: dict[str, dict] = {}
-_CONTROL_LOCK = threading.Lock()
+_STORE = ControlStore()
+
+def _wait_for_update(node_id: str) -> None:
+    _STORE.wait_for_update(node_id)
 
 def _set_params(node_id: str, shadow_adjustment: float, highlight_adjustment: float,
                 midpoint: float, feather_radius: float) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        new_params = (shadow_adjustment, highlight_adjustment, midpoint, feather_radius)
-        if entry.get("params") != new_params:
-            entry["params"] = new_params
-            entry["params_changed"] = True
-            entry["processing_complete"] = False
+    _STORE.set_params(node_id, (shadow_adjustment, highlight_adjustment, midpoint, feather_radius))
 
 def _get_params(node_id: str, *defaults: float) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return entry.get("params", defaults)
+    return _STORE.get_params(node_id, defaults)
 
 def _check_and_clear_params_changed(node_id: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        if entry.get("params_changed"):
-            entry["params_changed"] = False
-            return True
-        return False
+    return _STORE.check_and_clear_params_changed(node_id)
 
 def _set_processing_time(node_id: str, ms: int) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry["processing_time_ms"] = ms
-        entry["processing_complete"] = True
+    _STORE.set_processing_time(node_id, ms)
+
+def _touch_processing_time(node_id: str) -> None:
+    _STORE.touch_processing_time(node_id)
 
 def _get_processing_time(node_id: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return (entry.get("processing_time_ms", 0), entry.get("processing_complete", False))
+    return _STORE.get_processing_time(node_id)
 
 def _set_flag(node_id: str, flag: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry.setdefault("flags", {})[flag] = True
+    _STORE.set_flag(node_id, flag)
 
 def _check_and_clear_flag(node_id: str, flag: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        flags = entry.get("flags", {})
-        if flags.get(flag):
-            flags[flag] = False
-            return True
-        return False
+    return _STORE.check_and_clear_flag(node_id, flag)
 
 def _clear_all(node_id: str) -> None:
-    with _CONTROL_LOCK:
-        _CONTROL_STORE.pop(node_id, None)
+    _STORE.clear_all(node_id)
+
+@lru_cache(maxsize=8)
+def _sextant_channels(device):
+    """(6, 3) table: for each hue sextant, which of (c, x, 0) lands in R, G and B."""
+    return torch.tensor([[0, 1, 2], [1, 0, 2], [2, 0, 1],
+                         [2, 1, 0], [1, 2, 0], [0, 2, 1]], device=device)
+
+@lru_cache(maxsize=16)
+def _gaussian_kernel1d(ksize, sigma, device):
+    x = torch.arange(ksize, device=device, dtype=torch.float32) - (ksize - 1) / 2
+    # softmax = exp + normalise in one stable op
+    return torch.softmax(-(x * x) / (2 * sigma * sigma), dim=0)
+
+def _feather(masks, feather_radius):
+    """Separable Gaussian blur of (N, H, W) masks on their own device.
+
+    Kernel and edges match cv2.GaussianBlur's (ksize, sigma, BORDER_REFLECT_101).
+    """
+    ksize = max(3, int(feather_radius * 2) | 1)
+    pad = ksize // 2
+    kernel = _gaussian_kernel1d(ksize, feather_radius / 3.0, masks.device).to(masks.dtype)
+    _, height, width = masks.shape
+    x = masks.unsqueeze(1)
+    x = F.pad(x, (pad, pad, 0, 0), mode="reflect" if pad < width else "replicate")
+    x = F.conv2d(x, kernel.view(1, 1, 1, -1))
+    x = F.pad(x, (0, 0, pad, pad), mode="reflect" if pad < height else "replicate")
+    x = F.conv2d(x, kernel.view(1, 1, -1, 1))
+    return x.squeeze(1)
 
 def _apply(image, shadow_adjustment, highlight_adjustment, midpoint, feather_radius):
     device = image.device
     img = torch.clamp(image, 0, 1)
 
     r, g, b = img[..., 0], img[..., 1], img[..., 2]
-    max_c = torch.maximum(torch.maximum(r, g), b)
-    min_c = torch.minimum(torch.minimum(r, g), b)
+    max_c, max_idx = img[..., :3].max(dim=-1)
+    min_c = img[..., :3].amin(dim=-1)
     delta = max_c - min_c
 
     v = max_c
     s = torch.where(max_c != 0, delta / max_c, torch.zeros_like(max_c))
 
-    h = torch.zeros_like(max_c)
-    mask = delta != 0
-    mask_r = mask & (r == max_c)
-    h[mask_r] = 60 * (((g[mask_r] - b[mask_r]) / delta[mask_r]) % 6)
-    mask_g = mask & (g == max_c)
-    h[mask_g] = 60 * (((b[mask_g] - r[mask_g]) / delta[mask_g]) + 2)
-    mask_b = mask & (b == max_c)
-    h[mask_b] = 60 * (((r[mask_b] - g[mask_b]) / delta[mask_b]) + 4)
-    h = h % 360
+    # Hue from whichever channel holds the max; grey pixels (delta == 0) get hue 0
+    grey = delta == 0
+    delta_safe = delta.masked_fill(grey, 1.0)
+    h_candidates = torch.stack([((g - b) / delta_safe) % 6,
+                                (b - r) / delta_safe + 2,
+                                (r - g) / delta_safe + 4], dim=-1)
+    h = h_candidates.gather(-1, max_idx.unsqueeze(-1)).squeeze(-1).mul_(60).masked_fill_(grey, 0.0)
 
     shadow_mask = torch.clamp((midpoint - v) / (midpoint + 1e-10), 0, 1)
     highlight_mask = torch.clamp((v - midpoint) / (1.0 - midpoint + 1e-10), 0, 1)
 
     if feather_radius > 0:
-        ksize = max(3, int(feather_radius * 2) | 1)
-        shadow_np = shadow_mask[0].cpu().numpy()
-        highlight_np = highlight_mask[0].cpu().numpy()
-        shadow_blur = cv2.GaussianBlur(shadow_np, (ksize, ksize), feather_radius / 3.0)
-        highlight_blur = cv2.GaussianBlur(highlight_np, (ksize, ksize), feather_radius / 3.0)
-        shadow_mask = torch.from_numpy(shadow_blur).unsqueeze(0).to(device)
-        highlight_mask = torch.from_numpy(highlight_blur).unsqueeze(0).to(device)
+        # Both masks, every frame, in one batched pass
+        feathered = _feather(torch.cat([shadow_mask, highlight_mask]), feather_radius)
+        shadow_mask, highlight_mask = feathered.chunk(2)
 
     v_adjusted = v.clone()
     if shadow_adjustment != 0:
@@ -107,21 +104,11 @@ def _apply(image, shadow_adjustment, highlight_adjustment, midpoint, feather_rad
     c = v_adjusted * s
     x = c * (1 - torch.abs((h / 60) % 2 - 1))
     m = v_adjusted - c
-    h_i = (h / 60).long()
-
-    r_out = torch.zeros_like(h)
-    g_out = torch.zeros_like(h)
-    b_out = torch.zeros_like(h)
-
-    for idx, (rc, gc, bc) in enumerate([(c, x, 0), (x, c, 0), (0, c, x),
-                                         (0, x, c), (x, 0, c), (c, 0, x)]):
-        m_ = h_i == idx
-        r_out[m_] = (rc[m_] if isinstance(rc, torch.Tensor) else rc)
-        g_out[m_] = (gc[m_] if isinstance(gc, torch.Tensor) else gc)
-        b_out[m_] = (bc[m_] if isinstance(bc, torch.Tensor) else bc)
+    h_i = (h / 60).long().clamp_(0, 5)
 
-    rgb = torch.stack([r_out + m, g_out + m, b_out + m], dim=-1)
-    return torch.clamp(rgb, 0, 1)
+    vals = torch.stack([c, x, torch.zeros_like(c)], dim=-1)
+    rgb = vals.gather(-1, _sextant_channels(device)[h_i]).add_(m.unsqueeze(-1))
+    return rgb.clamp_(0, 1)
 
 class HighlightShadowC:
     @classmethod
@@ -150,6 +137,7 @@ class HighlightShadowC:
     FUNCTION = "adjust_highlight_shadow"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def adjust_highlight_shadow(self, image, shadow_adjustment, highlight_adjustment,
                                 midpoint, feather_radius, apply_type, unique_id=None):
         if unique_id:
@@ -168,6 +156,7 @@ class HighlightShadowC:
                 preview = _apply(image, *cur)
                 _set_processing_time(uid, int((time.time() - t0) * 1000))
                 _send_ram_preview(preview, uid)
+                last = cur
 
                 while True:
                     triggered = False
@@ -180,18 +169,23 @@ class HighlightShadowC:
                             break
                         if _check_and_clear_flag(uid, "skip"):
                             return {"result": (image,)}
-                        time.sleep(0.05)
+                        _wait_for_update(uid)
 
                     if not triggered:
                         break
 
                     cur = _get_params(uid, shadow_adjustment, highlight_adjustment, midpoint, feather_radius)
+                    if cur == last:
+                        _touch_processing_time(uid)
+                        continue
                     t0 = time.time()
                     preview = _apply(image, *cur)
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
-                result = _apply(image, *final)
+                # The last preview already holds the applied values
+                result = preview if final == last else _apply(image, *final)
 
             else:
                 batch_size = image.shape[0]
@@ -205,6 +199,7 @@ class HighlightShadowC:
                     preview = _apply(single, *cur)
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
                     final = None
                     while True:
@@ -220,19 +215,23 @@ class HighlightShadowC:
                                 result_list.append(single)
                                 final = None
                                 break
-                            time.sleep(0.05)
+                            _wait_for_update(uid)
 
                         if not triggered:
                             break
 
                         cur = _get_params(uid, shadow_adjustment, highlight_adjustment, midpoint, feather_radius)
+                        if cur == last:
+                            _touch_processing_time(uid)
+                            continue
                         t0 = time.time()
                         preview = _apply(single, *cur)
                         _set_processing_time(uid, int((time.time() - t0) * 1000))
                         _send_ram_preview(preview, uid)
+                        last = cur
 
                     if final is not None:
-                        result_list.append(_apply(single, *final))  # fixed: was using full `image`
+                        result_list.append(preview if final == last else _apply(single, *final))
 
                 result = torch.cat(result_list, dim=0)
         else:
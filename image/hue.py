@@ -1,7 +1,7 @@
 import torch
 import time
 import threading
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -161,6 +161,7 @@ class HueC:
     FUNCTION="hue"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def hue (self, image, hue, apply_type, unique_id=None):
 
         # Clean any stale data for this node
@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -653,6 +653,7 @@ class ImageFiltersC:
     FUNCTION = "apply_effect"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def apply_effect(self, image, filter_type, strength, edge_threshold, neon_hue, 
                      neon_blur, apply_type, unique_id=None):
         
@@ -1,113 +1,142 @@
 import torch
+import torch.nn.functional as F
 import cv2
 import numpy as np
-import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.control_store import ControlStore
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
-_CONTROL_STORE: dict[str, dict] = {}
-_CONTROL_LOCK = threading.Lock()
+_STORE = ControlStore()
+
+def _wait_for_update(node_id: str) -> None:
+    _STORE.wait_for_update(node_id)
 
 def _set_params(node_id: str, resize_by: bool, width: int, height: int, multiplier: float,
                 interpolation: str, fit_mode: str, bg_color: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        new_params = (resize_by, width, height, multiplier, interpolation, fit_mode, bg_color)
-        if entry.get("params") != new_params:
-            entry["params"] = new_params
-            entry["params_changed"] = True
-            entry["processing_complete"] = False
+    _STORE.set_params(node_id, (resize_by, width, height, multiplier, interpolation, fit_mode, bg_color))
 
 def _get_params(node_id: str, resize_by: bool, width: int, height: int, multiplier: float,
                 interpolation: str, fit_mode: str, bg_color: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return entry.get("params", (resize_by, width, height, multiplier, interpolation, fit_mode, bg_color))
+    return _STORE.get_params(node_id, (resize_by, width, height, multiplier, interpolation, fit_mode, bg_color))
 
 def _check_and_clear_params_changed(node_id: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        if entry.get("params_changed"):
-            entry["params_changed"] = False
-            return True
-        return False
+    return _STORE.check_and_clear_params_changed(node_id)
 
 def _set_processing_time(node_id: str, ms: int) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry["processing_time_ms"] = ms
-        entry["processing_complete"] = True
+    _STORE.set_processing_time(node_id, ms)
+
+def _touch_processing_time(node_id: str) -> None:
+    _STORE.touch_processing_time(node_id)
 
 def _get_processing_time(node_id: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return (entry.get("processing_time_ms", 0), entry.get("processing_complete", False))
+    return _STORE.get_processing_time(node_id)
 
 def _set_flag(node_id: str, flag: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry.setdefault("flags", {})[flag] = True
+    _STORE.set_flag(node_id, flag)
 
 def _check_and_clear_flag(node_id: str, flag: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        flags = entry.get("flags", {})
-        if flags.get(flag):
-            flags[flag] = False
-            return True
-        return False
+    return _STORE.check_and_clear_flag(node_id, flag)
 
 def _clear_all(node_id: str) -> None:
-    with _CONTROL_LOCK:
-        _CONTROL_STORE.pop(node_id, None)
+    _STORE.clear_all(node_id)
+
+# cv2 flags with a matching F.interpolate mode. Area and Lanczos stay on cv2:
+# torch "area" is adaptive pooling (blocky when upscaling, differently weighted
+# on non-integer downscales), and there is no torch Lanczos.
+_TORCH_MODES = {
+    cv2.INTER_NEAREST: "nearest",
+    cv2.INTER_LINEAR: "bilinear",
+    cv2.INTER_CUBIC: "bicubic",
+}
+
+def _interpolate(x, size, mode):
+    if mode in ("bilinear", "bicubic"):
+        return F.interpolate(x, size=size, mode=mode, align_corners=False)
+    return F.interpolate(x, size=size, mode=mode)
 
 def _apply(image, resize_by, width, height, multiplier, interp_method, fit_mode, bg_color):
+    mode = _TORCH_MODES.get(interp_method)
+    if mode is None:
+        return _apply_cv2(image, resize_by, width, height, multiplier, interp_method, fit_mode, bg_color)
+
+    # Whole batch in one call, on the image's own device
+    batch, orig_h, orig_w, channels = image.shape
+    target_w = max(1, int(orig_w * multiplier)) if resize_by else max(1, width)
+    target_h = max(1, int(orig_h * multiplier)) if resize_by else max(1, height)
+    x = image.movedim(-1, 1)
+
+    if fit_mode == "adjust":
+        out = _interpolate(x, (target_h, target_w), mode)
+
+    elif fit_mode == "crop":
+        ar = orig_w / orig_h
+        tar = target_w / target_h
+        if ar > tar:
+            new_h, new_w = target_h, max(target_w, round(target_h * ar))
+        else:
+            new_w, new_h = target_w, max(target_h, round(target_w / ar))
+        resized = _interpolate(x, (new_h, new_w), mode)
+        sx, sy = (new_w - target_w) // 2, (new_h - target_h) // 2
+        out = resized[..., sy:sy + target_h, sx:sx + target_w]
+
+    elif fit_mode == "fit":
+        ar = orig_w / orig_h
+        tar = target_w / target_h
+        if ar > tar:
+            new_w, new_h = target_w, int(target_w / ar)
+        else:
+            new_h, new_w = target_h, int(target_h * ar)
+        out = x.new_full((batch, channels, target_h, target_w), 1.0 if bg_color == "white" else 0.0)
+        sx, sy = (target_w - new_w) // 2, (target_h - new_h) // 2
+        out[..., sy:sy + new_h, sx:sx + new_w] = _interpolate(x, (new_h, new_w), mode)
+
+    if mode == "bicubic":
+        out = out.clamp(0.0, 1.0)
+    return out.movedim(1, -1).contiguous()
+
+def _apply_cv2(image, resize_by, width, height, multiplier, interp_method, fit_mode, bg_color):
     img_np = image.cpu().numpy()
-    bg_value = 255 if bg_color == "white" else 0
-    results = []
+    batch, orig_h, orig_w, channels = img_np.shape
+    target_w = max(1, int(orig_w * multiplier)) if resize_by else max(1, width)
+    target_h = max(1, int(orig_h * multiplier)) if resize_by else max(1, height)
+    ar = orig_w / orig_h
+    tar = target_w / target_h
 
-    for b in range(img_np.shape[0]):
-        img = img_np[b]
-        orig_h, orig_w = img.shape[:2]
-        img_uint8 = (img * 255).astype(np.uint8)
+    # Every frame lands in one preallocated batch buffer
+    out = np.empty((batch, target_h, target_w, channels), dtype=np.float32)
+    if fit_mode == "fit":
+        out.fill(1.0 if bg_color == "white" else 0.0)
 
-        target_w = max(1, int(orig_w * multiplier)) if resize_by else max(1, width)
-        target_h = max(1, int(orig_h * multiplier)) if resize_by else max(1, height)
-        h, w = img_uint8.shape[:2]
+    for b in range(batch):
+        img_f = np.ascontiguousarray(img_np[b], dtype=np.float32)
 
         if fit_mode == "adjust":
-            result_img = cv2.resize(img_uint8, (target_w, target_h), interpolation=interp_method)
+            dst = out[b]
+            resized = cv2.resize(img_f, (target_w, target_h), dst=dst, interpolation=interp_method)
+            if resized is not dst:
+                dst[...] = resized.reshape(dst.shape)
 
         elif fit_mode == "crop":
-            ar = w / h
-            tar = target_w / target_h
             if ar > tar:
-                new_h, new_w = target_h, int(target_h * ar)
+                new_h, new_w = target_h, max(target_w, round(target_h * ar))
             else:
-                new_w, new_h = target_w, int(target_w / ar)
-            resized = cv2.resize(img_uint8, (new_w, new_h), interpolation=interp_method)
+                new_w, new_h = target_w, max(target_h, round(target_w / ar))
+            resized = cv2.resize(img_f, (new_w, new_h), interpolation=interp_method)
             sx, sy = (new_w - target_w) // 2, (new_h - target_h) // 2
-            result_img = resized[sy:sy + target_h, sx:sx + target_w]
+            out[b] = resized[sy:sy + target_h, sx:sx + target_w].reshape(target_h, target_w, channels)
 
         elif fit_mode == "fit":
-            ar = w / h
-            tar = target_w / target_h
             if ar > tar:
                 new_w, new_h = target_w, int(target_w / ar)
             else:
                 new_h, new_w = target_h, int(target_h * ar)
-            resized = cv2.resize(img_uint8, (new_w, new_h), interpolation=interp_method)
-            result_img = np.full((target_h, target_w, img_uint8.shape[2]), bg_value, dtype=img_uint8.dtype)
+            resized = cv2.resize(img_f, (new_w, new_h), interpolation=interp_method)
             sx, sy = (target_w - new_w) // 2, (target_h - new_h) // 2
-            result_img[sy:sy + new_h, sx:sx + new_w] = resized
-
-        results.append(result_img.astype(np.float32) / 255.0)
+            out[b, sy:sy + new_h, sx:sx + new_w] = resized.reshape(new_h, new_w, channels)
 
-    return torch.from_numpy(np.stack(results)).float()
+    # Lanczos can overshoot [0, 1] on float input
+    np.clip(out, 0.0, 1.0, out=out)
+    return torch.from_numpy(out)
 
 class ImageResizeC:
     INTERPOLATION_METHODS = {
@@ -139,6 +168,7 @@ class ImageResizeC:
     FUNCTION = "resize"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def resize(self, image, resize_by, width, height, multiplier, interpolation,
                fit_mode, bg_color, apply_type, unique_id=None):
         interp_method = self.INTERPOLATION_METHODS[interpolation]
@@ -159,6 +189,7 @@ class ImageResizeC:
                 preview = _apply(image, cur[0], cur[1], cur[2], cur[3], self.INTERPOLATION_METHODS[cur[4]], cur[5], cur[6])
                 _set_processing_time(uid, int((time.time() - t0) * 1000))
                 _send_ram_preview(preview, uid)
+                last = cur
 
                 while True:
                     triggered = False
@@ -171,19 +202,24 @@ class ImageResizeC:
                             break
                         if _check_and_clear_flag(uid, "skip"):
                             return {"result": (image,)}
-                        time.sleep(0.05)
+                        _wait_for_update(uid)
 
                     if not triggered:
                         break
 
                     cur = _get_params(uid, resize_by, width, height, multiplier, interpolation, fit_mode, bg_color)
+                    if cur == last:
+                        _touch_processing_time(uid)
+                        continue
                     t0 = time.time()
                     preview = _apply(image, cur[0], cur[1], cur[2], cur[3], self.INTERPOLATION_METHODS[cur[4]], cur[5], cur[6])
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
-                result = _apply(image, final[0], final[1], final[2], final[3],
-                                self.INTERPOLATION_METHODS[final[4]], final[5], final[6])
+                # The last preview already holds the applied values
+                result = preview if final == last else _apply(image, final[0], final[1], final[2], final[3],
+                                                              self.INTERPOLATION_METHODS[final[4]], final[5], final[6])
 
             else:
                 batch_size = image.shape[0]
@@ -197,6 +233,7 @@ class ImageResizeC:
                     preview = _apply(single, cur[0], cur[1], cur[2], cur[3], self.INTERPOLATION_METHODS[cur[4]], cur[5], cur[6])
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
                     final = None
                     while True:
@@ -212,19 +249,24 @@ class ImageResizeC:
                                 result_list.append(single)
                                 final = None
                                 break
-                            time.sleep(0.05)
+                            _wait_for_update(uid)
 
                         if not triggered:
                             break
 
                         cur = _get_params(uid, resize_by, width, height, multiplier, interpolation, fit_mode, bg_color)
+                        if cur == last:
+                            _touch_processing_time(uid)
+                            continue
                         t0 = time.time()
                         preview = _apply(single, cur[0], cur[1], cur[2], cur[3], self.INTERPOLATION_METHODS[cur[4]], cur[5], cur[6])
                         _set_processing_time(uid, int((time.time() - t0) * 1000))
                         _send_ram_preview(preview, uid)
+                        last = cur
 
                     if final is not None:
-                        result_list.append(_apply(single, final[0], final[1], final[2], final[3],
+                        result_list.append(preview if final == last else
+                                           _apply(single, final[0], final[1], final[2], final[3],
                                                   self.INTERPOLATION_METHODS[final[4]], final[5], final[6]))
 
                 result = torch.cat(result_list, dim=0)
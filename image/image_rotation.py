@@ -1,121 +1,138 @@
 import torch
+import torch.nn.functional as F
 import cv2
 import numpy as np
-import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.control_store import ControlStore
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
-_CONTROL_STORE: dict[str, dict] = {}
-_CONTROL_LOCK = threading.Lock()
+_STORE = ControlStore()
+
+def _wait_for_update(node_id: str) -> None:
+    _STORE.wait_for_update(node_id)
 
 def _set_params(node_id: str, rotate: float, interpolation: str, fit_mode: str, bg_color: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        new_params = (rotate, interpolation, fit_mode, bg_color)
-        if entry.get("params") != new_params:
-            entry["params"] = new_params
-            entry["params_changed"] = True
-            entry["processing_complete"] = False
+    _STORE.set_params(node_id, (rotate, interpolation, fit_mode, bg_color))
 
 def _get_params(node_id: str, rotate: float, interpolation: str, fit_mode: str, bg_color: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return entry.get("params", (rotate, interpolation, fit_mode, bg_color))
+    return _STORE.get_params(node_id, (rotate, interpolation, fit_mode, bg_color))
 
 def _check_and_clear_params_changed(node_id: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        if entry.get("params_changed"):
-            entry["params_changed"] = False
-            return True
-        return False
+    return _STORE.check_and_clear_params_changed(node_id)
 
 def _set_processing_time(node_id: str, ms: int) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry["processing_time_ms"] = ms
-        entry["processing_complete"] = True
+    _STORE.set_processing_time(node_id, ms)
+
+def _touch_processing_time(node_id: str) -> None:
+    _STORE.touch_processing_time(node_id)
 
 def _get_processing_time(node_id: str) -> tuple:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id, {})
-        return (entry.get("processing_time_ms", 0), entry.get("processing_complete", False))
+    return _STORE.get_processing_time(node_id)
 
 def _set_flag(node_id: str, flag: str) -> None:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.setdefault(node_id, {})
-        entry.setdefault("flags", {})[flag] = True
+    _STORE.set_flag(node_id, flag)
 
 def _check_and_clear_flag(node_id: str, flag: str) -> bool:
-    with _CONTROL_LOCK:
-        entry = _CONTROL_STORE.get(node_id)
-        if not entry:
-            return False
-        flags = entry.get("flags", {})
-        if flags.get(flag):
-            flags[flag] = False
-            return True
-        return False
+    return _STORE.check_and_clear_flag(node_id, flag)
 
 def _clear_all(node_id: str) -> None:
-    with _CONTROL_LOCK:
-        _CONTROL_STORE.pop(node_id, None)
+    _STORE.clear_all(node_id)
+
+# cv2 flags with a matching F.grid_sample mode. Nearest, area and Lanczos stay on
+# cv2: grid_sample's nearest rounds half-pixel ties to even, which duplicates or
+# drops pixels where cv2 does not.
+_GRID_MODES = {
+    cv2.INTER_LINEAR: "bilinear",
+    cv2.INTER_CUBIC: "bicubic",
+}
+
+def _fit_scale(angle, w, h):
+    angle_rad = np.radians(abs(angle) % 180)
+    if angle_rad > np.pi / 2:
+        angle_rad = np.pi - angle_rad
+    return min(w / (w * np.cos(angle_rad) + h * np.sin(angle_rad)),
+               h / (w * np.sin(angle_rad) + h * np.cos(angle_rad)))
+
+def _rotation_matrix(angle, fit_mode, w, h):
+    """cv2 2x3 matrix, output (width, height), and whether it maps destination to source."""
+    center = ((w - 1) / 2.0, (h - 1) / 2.0)
+
+    if fit_mode == "crop":
+        return cv2.getRotationMatrix2D(center, -angle, 1.0), (w, h), False
+
+    if fit_mode == "fit":
+        return cv2.getRotationMatrix2D(center, -angle, _fit_scale(angle, w, h)), (w, h), False
+
+    if fit_mode == "adjust":
+        angle_rad = np.radians(abs(angle) % 180)
+        if angle_rad > np.pi / 2:
+            angle_rad = np.pi - angle_rad
+        scale = 1.0 if angle_rad < 0.001 else _fit_scale(angle, w, h)
+        return cv2.getRotationMatrix2D(center, angle, scale), (w, h), True
+
+    # "none": grow the canvas to hold the whole rotated image
+    M = cv2.getRotationMatrix2D(center, -angle, 1.0)
+    cos, sin = np.abs(M[0, 0]), np.abs(M[0, 1])
+    new_w = int(h * sin + w * cos)
+    new_h = int(h * cos + w * sin)
+    M[0, 2] += new_w / 2 - center[0]
+    M[1, 2] += new_h / 2 - center[1]
+    return M, (new_w, new_h), False
+
+def _grid_theta(src_from_dst, src_size, dst_size):
+    """Turn a pixel-space dst->src affine into affine_grid's normalised theta (align_corners=True)."""
+    (src_w, src_h), (dst_w, dst_h) = src_size, dst_size
+    to_pixels = np.array([[(dst_w - 1) / 2.0, 0.0, (dst_w - 1) / 2.0],
+                          [0.0, (dst_h - 1) / 2.0, (dst_h - 1) / 2.0],
+                          [0.0, 0.0, 1.0]])
+    to_normalised = np.array([[2.0 / max(src_w - 1, 1), 0.0, -1.0],
+                              [0.0, 2.0 / max(src_h - 1, 1), -1.0],
+                              [0.0, 0.0, 1.0]])
+    return (to_normalised @ np.vstack([src_from_dst, [0.0, 0.0, 1.0]]) @ to_pixels)[:2]
 
 def _apply(image, angle, interp_method, fit_mode, bg_color):
+    mode = _GRID_MODES.get(interp_method)
+    if mode is None:
+        return _apply_cv2(image, angle, interp_method, fit_mode, bg_color)
+
+    # Whole batch in one grid_sample, on the image's own device
+    batch, h, w, channels = image.shape
+    M, (out_w, out_h), inverse = _rotation_matrix(angle, fit_mode, w, h)
+    theta = _grid_theta(M if inverse else cv2.invertAffineTransform(M), (w, h), (out_w, out_h))
+    theta = torch.as_tensor(theta, dtype=image.dtype, device=image.device).expand(batch, 2, 3)
+    grid = F.affine_grid(theta, (batch, channels, out_h, out_w), align_corners=True)
+
+    # Sampling (image - bg) with zero padding is a constant bg border, as in cv2
+    bg = torch.zeros(channels, dtype=image.dtype, device=image.device)
+    bg[:3] = 1.0 if bg_color == "white" else 0.0
+    bg = bg.view(1, channels, 1, 1)
+    out = F.grid_sample(image.movedim(-1, 1) - bg, grid, mode=mode,
+                        padding_mode="zeros", align_corners=True).add_(bg)
+
+    if mode == "bicubic":
+        out = out.clamp_(0.0, 1.0)
+    return out.movedim(1, -1).contiguous()
+
+def _apply_cv2(image, angle, interp_method, fit_mode, bg_color):
     img_np = image.cpu().numpy()
-    bg_value = (255, 255, 255) if bg_color == "white" else (0, 0, 0)
-    results = []
-
-    for b in range(img_np.shape[0]):
-        img = img_np[b]
-        h, w = img.shape[:2]
-        center = ((w - 1) / 2.0, (h - 1) / 2.0)
-        img_uint8 = (img * 255).astype(np.uint8)
-
-        if fit_mode == "crop":
-            M = cv2.getRotationMatrix2D(center, -angle, 1.0)
-            rotated = cv2.warpAffine(img_uint8, M, (w, h), flags=interp_method,
-                                     borderMode=cv2.BORDER_CONSTANT, borderValue=bg_value)
-
-        elif fit_mode == "fit":
-            angle_rad = np.radians(abs(angle) % 180)
-            if angle_rad > np.pi / 2:
-                angle_rad = np.pi - angle_rad
-            scale = min(w / (w * np.cos(angle_rad) + h * np.sin(angle_rad)),
-                        h / (w * np.sin(angle_rad) + h * np.cos(angle_rad)))
-            M = cv2.getRotationMatrix2D(center, -angle, scale)
-            rotated = cv2.warpAffine(img_uint8, M, (w, h), flags=interp_method,
-                                     borderMode=cv2.BORDER_CONSTANT, borderValue=bg_value)
-
-        elif fit_mode == "adjust":
-            angle_rad = np.radians(abs(angle) % 180)
-            if angle_rad > np.pi / 2:
-                angle_rad = np.pi - angle_rad
-            if angle_rad < 0.001:
-                scale = 1.0
-            else:
-                scale = min(w / (w * np.cos(angle_rad) + h * np.sin(angle_rad)),
-                            h / (w * np.sin(angle_rad) + h * np.cos(angle_rad)))
-            M = cv2.getRotationMatrix2D(center, angle, scale)
-            rotated = cv2.warpAffine(img_uint8, M, (w, h),
-                                     flags=interp_method | cv2.WARP_INVERSE_MAP,
-                                     borderMode=cv2.BORDER_CONSTANT, borderValue=bg_value)
-
-        elif fit_mode == "none":
-            M = cv2.getRotationMatrix2D(center, -angle, 1.0)
-            cos, sin = np.abs(M[0, 0]), np.abs(M[0, 1])
-            new_w = int(h * sin + w * cos)
-            new_h = int(h * cos + w * sin)
-            M[0, 2] += new_w / 2 - center[0]
-            M[1, 2] += new_h / 2 - center[1]
-            rotated = cv2.warpAffine(img_uint8, M, (new_w, new_h), flags=interp_method,
-                                     borderMode=cv2.BORDER_CONSTANT, borderValue=bg_value)
-
-        results.append(rotated.astype(np.float32) / 255.0)
-
-    return torch.from_numpy(np.stack(results)).float()
+    batch, h, w, channels = img_np.shape
+    bg_value = (1.0, 1.0, 1.0) if bg_color == "white" else (0.0, 0.0, 0.0)
+    M, (out_w, out_h), inverse = _rotation_matrix(angle, fit_mode, w, h)
+    flags = interp_method | cv2.WARP_INVERSE_MAP if inverse else interp_method
+
+    # Same matrix for every frame; each warps straight into the batch buffer
+    out = np.empty((batch, out_h, out_w, channels), dtype=np.float32)
+    for b in range(batch):
+        img_f = np.ascontiguousarray(img_np[b], dtype=np.float32)
+        dst = out[b]
+        rotated = cv2.warpAffine(img_f, M, (out_w, out_h), dst=dst, flags=flags,
+                                 borderMode=cv2.BORDER_CONSTANT, borderValue=bg_value)
+        if rotated is not dst:
+            dst[...] = rotated.reshape(dst.shape)
+
+    # Lanczos can overshoot [0, 1] on float input
+    np.clip(out, 0.0, 1.0, out=out)
+    return torch.from_numpy(out)
 
 class ImageRotationC:
     INTERPOLATION_METHODS = {
@@ -144,6 +161,7 @@ class ImageRotationC:
     FUNCTION = "rotate"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def rotate(self, image, rotate, interpolation, fit_mode, bg_color, apply_type, unique_id=None):
         interp_method = self.INTERPOLATION_METHODS[interpolation]
 
@@ -163,6 +181,7 @@ class ImageRotationC:
                 preview = _apply(image, cur[0], self.INTERPOLATION_METHODS[cur[1]], cur[2], cur[3])
                 _set_processing_time(uid, int((time.time() - t0) * 1000))
                 _send_ram_preview(preview, uid)
+                last = cur
 
                 while True:
                     triggered = False
@@ -175,18 +194,23 @@ class ImageRotationC:
                             break
                         if _check_and_clear_flag(uid, "skip"):
                             return {"result": (image,)}
-                        time.sleep(0.05)
+                        _wait_for_update(uid)
 
                     if not triggered:
                         break
 
                     cur = _get_params(uid, rotate, interpolation, fit_mode, bg_color)
+                    if cur == last:
+                        _touch_processing_time(uid)
+                        continue
                     t0 = time.time()
                     preview = _apply(image, cur[0], self.INTERPOLATION_METHODS[cur[1]], cur[2], cur[3])
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
-                result = _apply(image, final[0], self.INTERPOLATION_METHODS[final[1]], final[2], final[3])
+                # The last preview already holds the applied values
+                result = preview if final == last else _apply(image, final[0], self.INTERPOLATION_METHODS[final[1]], final[2], final[3])
 
             else:
                 batch_size = image.shape[0]
@@ -200,6 +224,7 @@ class ImageRotationC:
                     preview = _apply(single, cur[0], self.INTERPOLATION_METHODS[cur[1]], cur[2], cur[3])
                     _set_processing_time(uid, int((time.time() - t0) * 1000))
                     _send_ram_preview(preview, uid)
+                    last = cur
 
                     final = None
                     while True:
@@ -215,19 +240,24 @@ class ImageRotationC:
                                 result_list.append(single)
                                 final = None
                                 break
-                            time.sleep(0.05)
+                            _wait_for_update(uid)
 
                         if not triggered:
                             break
 
                         cur = _get_params(uid, rotate, interpolation, fit_mode, bg_color)
+                        if cur == last:
+                            _touch_processing_time(uid)
+                            continue
                         t0 = time.time()
                         preview = _apply(single, cur[0], self.INTERPOLATION_METHODS[cur[1]], cur[2], cur[3])
                         _set_processing_time(uid, int((time.time() - t0) * 1000))
                         _send_ram_preview(preview, uid)
+                        last = cur
 
                     if final is not None:
-                        result_list.append(_apply(single, final[0], self.INTERPOLATION_METHODS[final[1]], final[2], final[3]))
+                        result_list.append(preview if final == last else
+                                           _apply(single, final[0], self.INTERPOLATION_METHODS[final[1]], final[2], final[3]))
 
                 result = torch.cat(result_list, dim=0)
         else:
@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -97,6 +97,7 @@ class ImageTranslationC:
     FUNCTION = "translate"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def translate(self, image, translate_x, translate_y, bg_color, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
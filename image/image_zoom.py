@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -163,6 +163,7 @@ class ImageZoomC:
     FUNCTION = "zoom_translate"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def zoom_translate(self, image, zoom, interpolation, translate_x, translate_y, bg_color, apply_type, unique_id=None):
         interp_method = self.INTERPOLATION_METHODS[interpolation]
 
@@ -2,7 +2,7 @@ import torch
 import math
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -88,6 +88,9 @@ def kelvin_to_rgb(temp_k):
     return (red / 255.0, green / 255.0, blue / 255.0)
 
 def _apply_temperature(image, temperature):
+    # 6500 K is the reference white – the adjustment is an identity there
+    if temperature == 6500.0:
+        return image
     r_mult, g_mult, b_mult = kelvin_to_rgb(temperature)
     r_ref, g_ref, b_ref = kelvin_to_rgb(6500.0)
 
@@ -130,6 +133,7 @@ class ColorTemperatureC:
     FUNCTION = "apply_effect"
     CATEGORY = "WtlNodes/image"
 
+    @_flushes_previews
     def apply_effect(self, image, temperature, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
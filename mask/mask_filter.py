@@ -3,7 +3,7 @@ import numpy as np
 from scipy import ndimage
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -114,6 +114,7 @@ class MaskFilterC:
     FUNCTION = "filter_masks"
     CATEGORY = "WtlNodes/mask"
 
+    @_flushes_previews
     def filter_masks(self, masks, area_x, area_y, keep, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
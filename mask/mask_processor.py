@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -110,6 +110,7 @@ class MaskProcessorC:
     FUNCTION = "process_mask"
     CATEGORY = "WtlNodes/mask"
 
+    @_flushes_previews
     def process_mask(self, mask, dilate_erode, feather, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
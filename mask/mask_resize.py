@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -185,6 +185,7 @@ class MaskResizeC:
     FUNCTION = "resize"
     CATEGORY = "WtlNodes/mask"
 
+    @_flushes_previews
     def resize(self, mask, resize_by, width, height, multiplier, interpolation,
                fit_mode, enhanced_visibility, apply_type, unique_id=None):
         interp_method = self.INTERPOLATION_METHODS[interpolation]
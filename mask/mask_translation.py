@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 import threading
 import time
-from ..helper.ram_preview import _send_ram_preview
+from ..helper.ram_preview import _send_ram_preview, _flushes_previews
 
 _CONTROL_STORE: dict[str, dict] = {}
 _CONTROL_LOCK = threading.Lock()
@@ -118,6 +118,7 @@ class MaskTranslationC:
     FUNCTION = "translate"
     CATEGORY = "WtlNodes/mask"
 
+    @_flushes_previews
     def translate(self, mask, translate_x, translate_y, enhanced_visibility, apply_type, unique_id=None):
         if unique_id:
             uid = str(unique_id)
@@ -1,4 +1,5 @@
 import { app } from "../../scripts/app.js";
+import { api } from "../../scripts/api.js";
 
 // Session-only storage
 class RAMImageStorage {
@@ -15,6 +16,12 @@ class RAMImageStorage {
     }
 }
 
+// Interactive previews arrive as JPEG, final previews as PNG
+export function previewDataUrl(base64Data) {
+    const mime = base64Data.startsWith("/9j/") ? "image/jpeg" : "image/png";
+    return `data:${mime};base64,${base64Data}`;
+}
+
 const imageStorage = new RAMImageStorage();
 const ramPreviewNodes = new Map();
 let needsRefresh = false;
@@ -55,6 +62,8 @@ app.registerExtension({
             nodeData.name === "WtlMaskCombiner"
         ) {
             
+            nodeType.prototype.isRamPreviewNode = true;
+
             const onExecuted = nodeType.prototype.onExecuted;
             
             nodeType.prototype.onExecuted = function(message) {
@@ -71,7 +80,7 @@ app.registerExtension({
                             this.imgs = this._ramPreviewImgs;
                             app.graph.setDirtyCanvas(true, false);
                         };
-                        img.src = `data:image/png;base64,${base64Data}`;
+                        img.src = previewDataUrl(base64Data);
                         this._ramPreviewImgs.push(img);
                     });
                     this.imgs = this._ramPreviewImgs;
@@ -121,6 +130,21 @@ app.registerExtension({
     }
 });
 
+// Interactive previews arrive as binary frames for the running node
+api.addEventListener("b_preview", ({ detail }) => {
+    const node = app.graph.getNodeById(app.runningNodeId);
+    if (!node?.isRamPreviewNode) return;
+
+    const img = new Image();
+    img.onload = () => {
+        URL.revokeObjectURL(img.src);
+        app.graph.setDirtyCanvas(true, false);
+    };
+    img.src = URL.createObjectURL(detail);
+    node._ramPreviewImgs = [img];
+    node.imgs = node._ramPreviewImgs;
+});
+
 // Only refresh when needed (after undo/redo)
 setInterval(() => {
     if (needsRefresh) {
@@ -131,7 +155,7 @@ setInterval(() => {
                 node.imgs = [];
                 cachedData.forEach((base64Data) => {
                     const img = new Image();
-                    img.src = `data:image/png;base64,${base64Data}`;
+                    img.src = previewDataUrl(base64Data);
                     node.imgs.push(img);
                 });
             }